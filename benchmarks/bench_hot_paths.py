@@ -0,0 +1,254 @@
+"""
+Benchmarks for the simulation hot paths.
+
+Times the generators, the coverage and t-test grids (loop, batched
+and parallel modes), studentt_robust_curves and
+plot_distribution_panels. Reports the median wall time of --repeats
+runs, throughput in replicates/sec and peak traced memory.
+
+Run from the repository root:
+
+    python benchmarks/bench_hot_paths.py
+    python benchmarks/bench_hot_paths.py --save-baseline
+
+Results are written to benchmarks/results.json. Each case's throughput
+is compared with benchmarks/baseline.json, and a case that is more
+than --tolerance slower is flagged; the exit status is non-zero if
+any case regressed. Baselines depend on the machine, so record one
+on the machine you compare against. Parallel cases are named without
+their worker count, which is stored with each result instead, and a
+note is printed when it differs from the baseline's.
+
+Peak memory is measured with tracemalloc in a separate run, so it
+does not slow the timed runs. It only sees the parent process, which
+means parallel cases report the parent's memory only.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+import numpy as np  # noqa: E402
+
+from distributions import DISTRIBUTIONS  # noqa: E402
+from confidence_intervals import run_coverage_experiment  # noqa: E402
+from hypothesis_testing import run_testing_experiment  # noqa: E402
+
+
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+RESULTS_PATH = os.path.join(BENCH_DIR, "results.json")
+
+SIZES = [50, 1000, 5000]
+REPLICATES = [1000]
+TOLERANCE = 0.5   # flag cases more than 50% below baseline throughput
+REPEATS = 5
+
+
+def measure(fn, repeats):
+    """
+    Median wall time of repeats calls of fn, then the peak traced
+    memory of one more call.
+
+    Returns:
+        (seconds, peak_bytes)
+    """
+    fn()   # warm-up: imports, caches, pool start-up code paths
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return float(np.median(times)), peak
+
+
+def benchmark_cases(sizes, replicate_counts, workers):
+    """
+    Every benchmark as (name, replicates, workers, fn). replicates
+    is the number of simulated samples one call of fn processes,
+    workers the number of processes it uses.
+    """
+    cases = []
+
+    # ---- Generators (one batched draw) ----
+    for reps in replicate_counts:
+        for n in sizes:
+            for name, gen, _ in DISTRIBUTIONS:
+                cases.append((
+                    f"generate/{name}/n={n}/reps={reps}", reps, 1,
+                    lambda gen=gen, n=n, reps=reps: gen(n, seed=0, reps=reps),
+                ))
+
+    # ---- Coverage and t-test grids, one row of sizes ----
+    modes = {
+        "loop": {"vectorized": False},
+        "batched": {"vectorized": True},
+        "parallel": {"vectorized": True, "workers": workers},
+    }
+    for run_fn, label in [(run_coverage_experiment, "coverage"),
+                          (run_testing_experiment, "ttest")]:
+        for reps in replicate_counts:
+            for n in sizes:
+                for mode, kwargs in modes.items():
+                    cases.append((
+                        f"{label}/{mode}/n={n}/reps={reps}",
+                        reps * len(DISTRIBUTIONS),
+                        kwargs.get("workers", 1),
+                        lambda run_fn=run_fn, n=n, reps=reps, kwargs=kwargs:
+                            run_fn(sizes=[n], reps=reps, **kwargs),
+                    ))
+
+    # ---- Remediation and figures (fixed module settings) ----
+    import remediation
+    import visualize
+
+    cases.append((
+        "remediation/studentt_robust_curves",
+        len(remediation.SAMPLE_SIZES) * remediation.N_REPLICATES, 1,
+        remediation.studentt_robust_curves,
+    ))
+
+    cases.append((
+        "visualize/plot_distribution_panels",
+        4 * 5000, 1,   # four distributions, 5000 sampling replicates each
+        visualize.plot_distribution_panels,
+    ))
+
+    return cases
+
+
+def compare(results, baseline, tolerance):
+    """
+    Names of the cases whose throughput fell more than tolerance
+    below the baseline. Cases missing from either side are skipped.
+    """
+    regressed = []
+
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+
+        floor = (1 - tolerance) * base["replicates_per_sec"]
+        if r["replicates_per_sec"] < floor:
+            regressed.append(name)
+
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the simulation hot paths."
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--replicates", type=int, nargs="+",
+                        default=REPLICATES)
+    parser.add_argument("--workers", type=int,
+                        default=max(2, os.cpu_count() or 1))
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--filter", default="",
+                        help="only run cases whose name contains this")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="also store these results as the baseline")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)["results"]
+
+    cases = [
+        case for case in benchmark_cases(args.sizes, args.replicates,
+                                         args.workers)
+        if args.filter in case[0]
+    ]
+
+    results = {}
+    print(f"{'case':<44}{'sec':>9}{'reps/sec':>12}{'peak MiB':>10}"
+          f"{'vs base':>9}")
+
+    # plot_distribution_panels writes to outputs/ under the cwd
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        os.makedirs("outputs")
+        try:
+            for name, reps, workers, fn in cases:
+                seconds, peak = measure(fn, args.repeats)
+                results[name] = {
+                    "seconds": seconds,
+                    "replicates": reps,
+                    "workers": workers,
+                    "replicates_per_sec": reps / seconds,
+                    "peak_mib": peak / 2**20,
+                }
+
+                base = baseline.get(name)
+                ratio = "-"
+                if base is not None:
+                    speedup = reps / seconds / base["replicates_per_sec"]
+                    ratio = f"{speedup:.2f}x"
+
+                print(f"{name:<44}{seconds:>9.4f}"
+                      f"{reps / seconds:>12.0f}{peak / 2**20:>10.1f}"
+                      f"{ratio:>9}")
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        "machine": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "settings": {
+            "sizes": args.sizes,
+            "replicates": args.replicates,
+            "workers": args.workers,
+            "repeats": args.repeats,
+        },
+        "results": results,
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved: {args.output}")
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline: {BASELINE_PATH}")
+        return 0
+
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is not None and base.get("workers", 1) != r["workers"]:
+            print(f"NOTE: {name} ran with {r['workers']} workers, "
+                  f"baseline with {base.get('workers', 1)}")
+
+    regressed = compare(results, baseline, args.tolerance)
+    for name in regressed:
+        print(f"REGRESSION: {name}")
+
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
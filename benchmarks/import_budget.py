@@ -0,0 +1,93 @@
+"""
+Import-time budget for the entry-point modules.
+
+Each module is imported in a fresh interpreter with -X importtime
+(the way a short-lived worker process pays for it) and its cumulative
+import time is checked against IMPORT_BUDGET_MS. Heavy libraries in
+HEAVY_MODULES must not be loaded by a bare import; they belong inside
+the functions that use them.
+
+Run from the repository root:
+
+    python benchmarks/import_budget.py
+
+Exits non-zero if any module is over budget or pulls in a heavy import.
+"""
+
+import os
+import subprocess
+import sys
+
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# Cumulative import time allowed per module, in milliseconds.
+# NumPy alone accounts for most of it.
+IMPORT_BUDGET_MS = {
+    "distributions": 120,
+    "estimation": 150,
+    "convergence": 150,
+    "confidence_intervals": 150,
+    "hypothesis_testing": 150,
+    "remediation": 150,
+    "visualize": 150,
+}
+
+HEAVY_MODULES = ("pandas", "scipy", "matplotlib", "sklearn")
+
+N_RUNS = 5   # best of N_RUNS, to damp scheduler noise
+
+
+def measure_import(module):
+    """
+    Import module in a fresh interpreter with -X importtime.
+
+    Returns:
+        cumulative_ms: cumulative import time of module
+        heavy: heavy modules that ended up in sys.modules
+    """
+    code = (
+        f"import {module}, sys; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=SRC_DIR, capture_output=True, text=True, check=True,
+    )
+
+    cumulative_us = None
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            cumulative_us = int(fields[1])
+
+    heavy = [m for m in proc.stdout.strip().split(",") if m]
+    return cumulative_us / 1000, heavy
+
+
+def main():
+    failures = 0
+
+    print(f"{'module':<22}{'ms':>8}{'budget':>8}  status")
+
+    for module, budget in IMPORT_BUDGET_MS.items():
+        runs = [measure_import(module) for _ in range(N_RUNS)]
+        ms = min(r[0] for r in runs)
+        heavy = runs[0][1]
+
+        problems = []
+        if ms > budget:
+            problems.append("over budget")
+        if heavy:
+            problems.append("loads " + ", ".join(heavy))
+
+        failures += bool(problems)
+        status = "; ".join(problems) if problems else "ok"
+        print(f"{module:<22}{ms:>8.1f}{budget:>8}  {status}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
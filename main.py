@@ -0,0 +1,70 @@
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+import profiling  # noqa: E402
+from runner import EXPERIMENTS, METHODS, load_config, main  # noqa: E402
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the simulation experiments described by a "
+                    "JSON config file (see runner.load_config)."
+    )
+    parser.add_argument("config", nargs="?", default=None,
+                        help="JSON experiment spec; defaults are used "
+                             "for every key it leaves out")
+    parser.add_argument("--experiments", nargs="+", choices=EXPERIMENTS,
+                        help="run only these experiments")
+    parser.add_argument("--method", choices=METHODS,
+                        help="how replicates are drawn; for the coverage "
+                             "and testing grids a config 'tol' overrides "
+                             "this")
+    parser.add_argument("--replicates", type=int,
+                        help="replicates per grid cell; ignored by the "
+                             "coverage and testing grids when the config "
+                             "sets 'tol'")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--cache-dir")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="recompute every experiment instead of "
+                             "reading or writing the result cache")
+    parser.add_argument("--checkpoint-dir",
+                        help="save finished chunks and cells here so an "
+                             "interrupted run can resume")
+    parser.add_argument("--output-dir")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="record per-stage timings and save them as a "
+                             "Chrome trace (JSON)")
+    parser.add_argument("--profile-stage", metavar="STAGE",
+                        help="run every stage of this name (e.g. generate, "
+                             "statistic) under cProfile")
+    parser.add_argument("--profile-out", metavar="PATH",
+                        default="profile.pstats")
+    args = parser.parse_args()
+
+    if args.trace or args.profile_stage:
+        profiling.enable(profile_stage=args.profile_stage)
+
+    main(load_config(
+        args.config,
+        experiments=args.experiments,
+        method=args.method,
+        replicates=args.replicates,
+        workers=args.workers,
+        cache_dir="" if args.no_cache else args.cache_dir,
+        checkpoint_dir=args.checkpoint_dir,
+        output_dir=args.output_dir,
+    ))
+
+    if profiling.is_enabled():
+        print()
+        profiling.print_summary()
+    if args.trace:
+        profiling.write_trace(args.trace)
+        print(f"Saved: {args.trace}")
+    if args.profile_stage:
+        profiling.write_profile(args.profile_out)
+        print(f"Saved: {args.profile_out}")
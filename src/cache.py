@@ -0,0 +1,249 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sys
+
+import numpy as np
+
+import distributions
+
+CACHE_DIR = ".cache/experiments"
+MAX_CACHE_BYTES = 256 * 1024 * 1024   # evict least recently used beyond this
+
+# Input digests of rendered figures, one file per output directory
+FIGURE_MANIFEST = "figure_digests.json"
+
+# Module-level settings that change an experiment's output
+GRID_SETTINGS = ["SAMPLE_SIZES", "N_REPLICATES", "ALPHA"]
+
+# Keyword arguments that never change results
+# (see parallel.run_tasks and checkpoint)
+IGNORED_KWARGS = {"workers", "checkpoint_dir"}
+
+
+def code_version():
+    """
+    Hash of every source file in this package, so any code change
+    invalidates previously cached results.
+    """
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    h = hashlib.sha256()
+
+    for name in sorted(os.listdir(src_dir)):
+        if name.endswith(".py"):
+            with open(os.path.join(src_dir, name), "rb") as f:
+                h.update(name.encode())
+                h.update(f.read())
+
+    return h.hexdigest()
+
+
+def describe(obj):
+    """
+    JSON fallback for experiment_key and checkpoint names: functions
+    are named by module and qualified name (their repr holds a
+    per-process address) and partials by their function and bound
+    arguments.
+    """
+    if isinstance(obj, functools.partial):
+        return [describe(obj.func), list(obj.args), obj.keywords]
+    if callable(obj):
+        return f"{obj.__module__}.{obj.__qualname__}"
+    return repr(obj)
+
+
+def experiment_key(run_fn, kwargs):
+    """
+    Content address of one experiment run: the function, its
+    arguments, the grid settings of its module, the replicate block
+    size (it decides chunk boundaries, hence the draws) and the code
+    version.
+    """
+    module = sys.modules[run_fn.__module__]
+    spec = {
+        "experiment": f"{run_fn.__module__}.{run_fn.__qualname__}",
+        "kwargs": {
+            k: v for k, v in sorted(kwargs.items()) if k not in IGNORED_KWARGS
+        },
+        "settings": {
+            name: getattr(module, name)
+            for name in GRID_SETTINGS
+            if hasattr(module, name)
+        },
+        "block_elements": distributions.MAX_BLOCK_ELEMENTS,
+        "code": code_version(),
+    }
+    blob = json.dumps(spec, sort_keys=True, default=describe)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def save_frame(df, path):
+    """
+    Write a DataFrame column by column to an .npz file.
+    The file is written under a temporary name and renamed into
+    place, so readers never see a partial file.
+    """
+    arrays = {f"col{i}": df[c].to_numpy() for i, c in enumerate(df.columns)}
+    arrays = {
+        k: v.astype(str) if v.dtype == object else v
+        for k, v in arrays.items()
+    }
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, columns=np.array(df.columns, dtype=str), **arrays)
+    os.replace(tmp, path)
+
+
+def load_frame(path):
+    """Read a DataFrame written by save_frame."""
+    import pandas as pd
+
+    with np.load(path, allow_pickle=False) as data:
+        columns = [str(c) for c in data["columns"]]
+        return pd.DataFrame({
+            c: data[f"col{i}"] for i, c in enumerate(columns)
+        })
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """
+    Delete least recently used entries until the cache fits in
+    max_bytes. Reads refresh an entry's modification time.
+
+    Other processes may evict the same entries concurrently (e.g.
+    pipeline.run_graph nodes), so files that vanish are skipped.
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".npz"):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            info = os.stat(path)
+        except OSError:
+            continue
+        entries.append((info.st_mtime, info.st_size, path))
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        total -= size
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def cached_experiment(run_fn, cache_dir=CACHE_DIR,
+                      max_bytes=MAX_CACHE_BYTES, **kwargs):
+    """
+    Return run_fn(**kwargs), reusing the stored result when the
+    same experiment already ran with the same settings and code.
+
+    Returns:
+        pandas DataFrame produced by run_fn
+    """
+    path = os.path.join(cache_dir, experiment_key(run_fn, kwargs) + ".npz")
+
+    try:
+        os.utime(path)   # mark as recently used
+        return load_frame(path)
+    except FileNotFoundError:
+        pass   # not cached, or evicted by another process meanwhile
+
+    df = run_fn(**kwargs)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    save_frame(df, path)
+    evict(cache_dir, max_bytes)
+
+    return df
+
+
+# ============================================================
+# FIGURE INPUT HASHES (incremental rebuilds)
+# ============================================================
+
+def _feed(h, obj):
+    """Add a stable byte encoding of obj to the hash h."""
+    # pandas is only loaded if some caller already produced a DataFrame
+    pd = sys.modules.get("pandas")
+
+    if pd is not None and isinstance(obj, pd.DataFrame):
+        h.update(repr(list(obj.columns)).encode())
+        h.update(pd.util.hash_pandas_object(obj, index=True).values.tobytes())
+    elif isinstance(obj, np.ndarray):
+        h.update(f"{obj.dtype}{obj.shape}".encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, (list, tuple)):
+        h.update(b"(")
+        for item in obj:
+            _feed(h, item)
+        h.update(b")")
+    elif isinstance(obj, dict):
+        for key in sorted(obj, key=repr):
+            _feed(h, key)
+            _feed(h, obj[key])
+    elif isinstance(obj, functools.partial):
+        _feed(h, (obj.func, obj.args, obj.keywords))
+    elif callable(obj):
+        h.update(inspect.getsource(obj).encode())
+    else:
+        h.update(repr(obj).encode())
+
+
+def input_hash(*objects):
+    """
+    Hex digest of a figure's inputs: DataFrames, arrays, scalars,
+    containers of these, and functions (hashed by source code).
+    """
+    h = hashlib.sha256()
+    for obj in objects:
+        _feed(h, obj)
+    return h.hexdigest()
+
+
+def _manifest_path(path):
+    return os.path.join(os.path.dirname(path), FIGURE_MANIFEST)
+
+
+def _read_manifest(manifest):
+    try:
+        with open(manifest) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def figure_is_current(path, digest):
+    """
+    True if the image at path exists and was rendered from inputs
+    with this digest (recorded by record_figure in the figure
+    manifest of its directory).
+    """
+    recorded = _read_manifest(_manifest_path(path))
+    return (os.path.exists(path)
+            and recorded.get(os.path.basename(path)) == digest)
+
+
+def record_figure(path, digest):
+    """
+    Store the input digest of a freshly rendered image in the figure
+    manifest of its directory. The manifest is tracked next to the
+    images, so a fresh checkout knows which figures are current.
+    """
+    manifest = _manifest_path(path)
+    recorded = _read_manifest(manifest)
+    recorded[os.path.basename(path)] = digest
+
+    tmp = manifest + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(recorded, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp, manifest)
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+
+from cache import code_version, describe
+
+
+def checkpoint_path(checkpoint_dir, *labels):
+    """
+    File holding the checkpoint of one unit of work, named by a hash
+    of its labels (experiment, generator, n, replicates, ...) and the
+    code version, so a resumed run never merges state written for
+    different settings or code.
+    """
+    blob = json.dumps([labels, code_version()], default=describe)
+    name = hashlib.sha256(blob.encode()).hexdigest()[:32]
+    return os.path.join(checkpoint_dir, name + ".json")
+
+
+def save_state(path, state):
+    """
+    Write a JSON-serializable state to path atomically: the data is
+    flushed to a temporary file, which is then renamed into place,
+    so a crash leaves either the old checkpoint or the new one.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_state(path):
+    """The state saved at path, or None if there is none."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def checkpointed_call(path, fn, *args):
+    """
+    Per-cell checkpoint: return the result saved at path, or compute
+    fn(*args), save it and return it. The result must be made of
+    JSON-serializable numbers, lists and tuples (tuples come back
+    as lists).
+    """
+    state = load_state(path)
+    if state is not None:
+        return state["result"]
+
+    result = fn(*args)
+    save_state(path, {"result": result})
+    return result
+
+
+def checkpointed_chunks(path, chunk_fn, tasks):
+    """
+    Per-chunk checkpoint: call chunk_fn(*args) for each task in order,
+    saving the list of chunk results after every chunk. A resumed call
+    skips the chunks already saved, so merging the returned list gives
+    exactly what an uninterrupted run gives.
+
+    Returns:
+        list of chunk results, one per task
+    """
+    state = load_state(path) or {"results": []}
+    results = state["results"]
+
+    for args in tasks[len(results):]:
+        results.append(chunk_fn(*args))
+        save_state(path, {"results": results})
+
+    return results
+
+
+def checkpointed_tasks(checkpoint_dir, label, fn, tasks):
+    """
+    Wrap run_tasks arguments so that each task's result is saved as a
+    per-cell checkpoint under checkpoint_dir (nothing changes if it is
+    None). label names the experiment in the checkpoint file name.
+
+    Returns:
+        (fn, tasks) to pass to parallel.run_tasks
+    """
+    if checkpoint_dir is None:
+        return fn, tasks
+
+    return checkpointed_call, [
+        (checkpoint_path(checkpoint_dir, label, fn, *args), fn, *args)
+        for args in tasks
+    ]
@@ -1,13 +1,19 @@
+import functools
+
 import numpy as np
-import pandas as pd
-from scipy import stats
 
+from checkpoint import checkpoint_path, checkpointed_chunks, checkpointed_tasks
 from distributions import (
-    generate_normal,
-    generate_lognormal,
-    generate_student_t,
-    generate_mixture,
+    replicate_chunks,
+    prefix_safe,
+    DISTRIBUTIONS,
 )
+from estimation import nested_mean_and_variance
+from moments import MomentAccumulator
+from parallel import run_tasks, run_grouped
+from profiling import stage, staged
+from sequential import run_until_precise
+from streams import cell_key, chunk_seed, generator_name
 
 
 SAMPLE_SIZES = [50, 200, 500, 1000, 5000]
@@ -19,8 +25,14 @@ def standard_95_ci(samples):
     Construct a classical 95% confidence interval for the mean
     using the normal approximation.
 
+    samples may also be a moments.MomentAccumulator, so the
+    interval can be built from a sample streamed in chunks.
+
     Returns: (lower_bound, upper_bound)
     """
+    if isinstance(samples, MomentAccumulator):
+        return ci_from_moments(samples.mean, samples.variance(), samples.count)
+
     n = len(samples)
     sample_mean = np.mean(samples)
     sample_std = np.std(samples, ddof=1)
@@ -31,7 +43,94 @@ def standard_95_ci(samples):
     return sample_mean - margin, sample_mean + margin
 
 
-def coverage_experiment(generator_fn, true_mean, n, seed_start=0):
+def ci_from_moments(sample_mean, sample_variance, n):
+    """
+    Classical 95% interval from precomputed moments.
+    Works elementwise on scalars or arrays.
+
+    Returns: (lower_bound, upper_bound)
+    """
+    z = 1.96  # 95% critical value
+
+    margin = z * np.sqrt(sample_variance / n)
+    return sample_mean - margin, sample_mean + margin
+
+
+def batched_95_ci(block):
+    """
+    Vectorized standard_95_ci for a (reps, n) block of samples:
+    one interval per row, computed along axis 1. block may also be
+    a MomentAccumulator of shape (reps,).
+
+    Returns: (lower_bounds, upper_bounds), arrays of shape (reps,)
+    """
+    if isinstance(block, MomentAccumulator):
+        return standard_95_ci(block)
+
+    n = block.shape[1]
+    sample_mean = np.mean(block, axis=1)
+    sample_std = np.std(block, axis=1, ddof=1)
+
+    z = 1.96  # 95% critical value
+
+    margin = z * sample_std / np.sqrt(n)
+    return sample_mean - margin, sample_mean + margin
+
+
+def coverage_chunk(generator_fn, true_mean, n, reps, seed):
+    """
+    Draw one (reps, n) block and score all of its intervals at once.
+
+    Returns:
+        hits: number of intervals that contain true_mean
+        width_sum: summed width of the intervals
+    """
+    with stage("generate", n=n, reps=reps):
+        block, _, _ = generator_fn(n, seed=seed, reps=reps)
+
+    with stage("statistic", n=n, reps=reps):
+        lower, upper = batched_95_ci(block)
+        hits = (lower <= true_mean) & (true_mean <= upper)
+        return int(np.sum(hits)), float(np.sum(upper - lower))
+
+
+def coverage_tasks(generator_fn, true_mean, n, seed_start=0,
+                   reps=None):
+    """
+    Split one cell's reps replicates into coverage_chunk calls,
+    one per memory-bounded replicate chunk.
+
+    Returns:
+        list of argument tuples for coverage_chunk
+    """
+    reps = N_REPLICATES if reps is None else reps
+
+    cell = cell_key("coverage", generator_name(generator_fn), n)
+    return [
+        (generator_fn, true_mean, n, stop - start,
+         chunk_seed(cell, start, seed=seed_start))
+        for start, stop in replicate_chunks(reps, n)
+    ]
+
+
+def merge_coverage(chunk_results, reps=None):
+    """
+    Combine coverage_chunk results, in chunk order, into
+    (coverage_rate, avg_width) for a cell of reps replicates.
+    """
+    reps = N_REPLICATES if reps is None else reps
+
+    hits, width_sum = 0, 0.0
+
+    for h, w in chunk_results:
+        hits += h
+        width_sum += w
+
+    return hits / reps, width_sum / reps
+
+
+def coverage_experiment(generator_fn, true_mean, n, seed_start=0,
+                        vectorized=False, reps=None):
     """
     Run repeated sampling to estimate empirical CI coverage.
 
@@ -40,17 +139,34 @@ def coverage_experiment(generator_fn, true_mean, n, seed_start=0):
         true_mean: true population mean
         n: sample size
         seed_start: starting random seed for reproducibility
+            (the root seed of the chunk streams when vectorized)
+        vectorized: draw replicates as (reps, n) blocks, chunked so
+            that at most MAX_BLOCK_ELEMENTS values are held at once;
+            each chunk draws from its own independent stream
+            (see streams.chunk_seed)
+        reps: number of repeated experiments
 
     Returns:
         coverage_rate: fraction of intervals that contain true_mean
         avg_width: average width of the CI
     """
+    reps = N_REPLICATES if reps is None else reps
+
+    if vectorized:
+        return merge_coverage([
+            coverage_chunk(*args)
+            for args in coverage_tasks(generator_fn, true_mean, n, seed_start,
+                                       reps)
+        ], reps)
+
     covers = []
     widths = []
 
-    for i in range(N_REPLICATES):
-        samples, _, _ = generator_fn(n, seed=seed_start + i)
-        lower, upper = standard_95_ci(samples)
+    for i in range(reps):
+        with stage("generate", n=n):
+            samples, _, _ = generator_fn(n, seed=seed_start + i)
+        with stage("statistic", n=n):
+            lower, upper = standard_95_ci(samples)
 
         covers.append(lower <= true_mean <= upper)
         widths.append(upper - lower)
@@ -61,64 +177,220 @@ def coverage_experiment(generator_fn, true_mean, n, seed_start=0):
     return coverage_rate, avg_width
 
 
-def run_coverage_experiment():
+def coverage_from_moments(means, variances, n, true_mean):
+    """
+    CI coverage of replicates given by their means and unbiased
+    variances, e.g. from estimation.sampling_distribution, so the
+    replicates can be shared with other statistics (see
+    runner.shared_cell).
+
+    Returns:
+        coverage_rate: fraction of intervals that contain true_mean
+        avg_width: average width of the CI
+    """
+    with stage("statistic", n=n, reps=len(means)):
+        lower, upper = ci_from_moments(means, variances, n)
+        covers = (lower <= true_mean) & (true_mean <= upper)
+        return float(np.mean(covers)), float(np.mean(upper - lower))
+
+
+def adaptive_coverage_experiment(generator_fn, true_mean, n, tol,
+                                 seed_start=0, checkpoint=None):
+    """
+    Sequential version of coverage_experiment: replicate batches are
+    drawn only until the binomial standard error of the coverage
+    estimate falls below tol, so well-calibrated cells stop early and
+    badly miscalibrated ones get more replicates.
+
+    checkpoint is an optional file that saves the running totals
+    after every batch (see sequential.run_until_precise).
+
+    Returns:
+        coverage_rate: fraction of intervals that contain true_mean
+        avg_width: average width of the CI
+        replicates: number of replicates used
+    """
+    cell = cell_key("coverage", generator_name(generator_fn), n)
+    chunk_fn = functools.partial(coverage_chunk, generator_fn, true_mean, n)
+
+    (hits, width_sum), done = run_until_precise(
+        chunk_fn, n, cell, tol, seed_start=seed_start, checkpoint=checkpoint
+    )
+    return hits / done, width_sum / done, done
+
+
+def nested_coverage_experiment(generator_fn, true_mean, sizes, seed_start=0,
+                               reps=None):
+    """
+    Nested design: each replicate is drawn once at max(sizes) and
+    every smaller n is read off as a prefix of the same sample.
+
+    All sizes are scored from one cumulative reduction per block
+    instead of one fresh draw per size. sizes may come in any order
+    (results follow it); the draws depend only on the set of sizes.
+
+    Returns:
+        list of (coverage_rate, avg_width), one per entry of sizes
+    """
+    reps = N_REPLICATES if reps is None else reps
+
+    cell = cell_key(
+        "coverage-nested", generator_name(generator_fn),
+        tuple(sorted(set(int(m) for m in sizes))),
+    )
+    generator_fn = prefix_safe(generator_fn)
+    sizes = np.asarray(sizes)
+    n_max = int(sizes.max())
+
+    hits = np.zeros(len(sizes), dtype=int)
+    width_sum = np.zeros(len(sizes))
+
+    for start, stop in replicate_chunks(reps, n_max):
+        with stage("generate", n=n_max, reps=stop - start):
+            block, _, _ = generator_fn(
+                n_max, seed=chunk_seed(cell, start, seed=seed_start),
+                reps=stop - start,
+            )
+
+        with stage("statistic", n=n_max, reps=stop - start):
+            means, variances = nested_mean_and_variance(block, sizes)
+            lower, upper = ci_from_moments(means, variances, sizes)
+
+            hits += np.sum((lower <= true_mean) & (true_mean <= upper), axis=0)
+            width_sum += np.sum(upper - lower, axis=0)
+
+    return [
+        (h / reps, float(w) / reps)
+        for h, w in zip(hits, width_sum)
+    ]
+
+
+@staged("coverage_experiment")
+def run_coverage_experiment(vectorized=False, nested=False, workers=None,
+                            tol=None, sizes=None, reps=None,
+                            distributions=DISTRIBUTIONS, checkpoint_dir=None):
     """
     Compute empirical 95% CI coverage for each distribution
     and each sample size.
 
+    vectorized=True uses the batched (reps, n) coverage engine.
+    nested=True reuses one draw per replicate across all sizes
+    (see nested_coverage_experiment).
+    workers > 1 spreads grid cells (and, when vectorized, the
+    replicate chunks inside each cell) over a process pool;
+    the results do not depend on the worker count.
+    tol switches to adaptive replicate counts (see
+    adaptive_coverage_experiment) and adds a 'replicates' column.
+    It takes precedence: vectorized, nested and reps are then
+    ignored, since each cell draws batches until the precision
+    target is met.
+    sizes, reps and distributions override the default grid
+    (SAMPLE_SIZES and N_REPLICATES, read at call time);
+    distributions holds (name, generator_fn, true_mean) entries
+    like distributions.DISTRIBUTIONS.
+    checkpoint_dir saves finished work as it goes: every replicate
+    chunk (vectorized) or batch (adaptive), otherwise every grid
+    cell. Rerunning with the same directory after an interruption
+    skips the saved work and gives the same results as an
+    uninterrupted run.
+
     Returns:
         pandas DataFrame with:
         ['distribution', 'n', 'coverage', 'avg_ci_width']
     """
-    records = []
+    import pandas as pd
 
-    for n in SAMPLE_SIZES:
+    sizes = SAMPLE_SIZES if sizes is None else sizes
+    reps = N_REPLICATES if reps is None else reps
 
-        # ---- Normal ----
-        coverage, width = coverage_experiment(
-            generate_normal, true_mean=0.0, n=n
-        )
-        records.append({
-            "distribution": "normal",
-            "n": n,
-            "coverage": coverage,
-            "avg_ci_width": width,
-        })
+    cells = [(name, n) for n in sizes for name, _, _ in distributions]
 
-        # ---- Lognormal ----
-        coverage, width = coverage_experiment(
-            generate_lognormal, true_mean=np.exp(0.5), n=n
+    if tol is not None:
+        results = run_tasks(
+            adaptive_coverage_experiment,
+            [
+                (gen, true_mean, n, tol, 0,
+                 checkpoint_path(checkpoint_dir, "coverage", gen, n, tol)
+                 if checkpoint_dir else None)
+                for n in sizes
+                for _, gen, true_mean in distributions
+            ],
+            workers,
         )
-        records.append({
-            "distribution": "lognormal",
-            "n": n,
-            "coverage": coverage,
-            "avg_ci_width": width,
-        })
+        records = [
+            {
+                "distribution": name,
+                "n": n,
+                "coverage": coverage,
+                "avg_ci_width": width,
+                "replicates": reps,
+            }
+            for (name, n), (coverage, width, reps) in zip(cells, results)
+        ]
+        with stage("aggregate"):
+            return pd.DataFrame.from_records(records)
 
-        # ---- Student-t ----
-        coverage, width = coverage_experiment(
-            generate_student_t, true_mean=0.0, n=n
+    if nested:
+        fn, tasks = checkpointed_tasks(
+            checkpoint_dir, "coverage-nested", nested_coverage_experiment,
+            [
+                (gen, true_mean, sizes, 0, reps)
+                for _, gen, true_mean in distributions
+            ],
         )
-        records.append({
-            "distribution": "student_t",
-            "n": n,
-            "coverage": coverage,
-            "avg_ci_width": width,
-        })
+        per_dist = run_tasks(fn, tasks, workers)
+        results = [
+            per_dist[d][i]
+            for i in range(len(sizes))
+            for d in range(len(distributions))
+        ]
 
-        # ---- Mixture ----
-        coverage, width = coverage_experiment(
-            generate_mixture, true_mean=0.0, n=n
+    elif vectorized:
+        groups = [
+            coverage_tasks(gen, true_mean, n, reps=reps)
+            for n in sizes
+            for _, gen, true_mean in distributions
+        ]
+
+        if checkpoint_dir is None:
+            chunk_results = run_grouped(coverage_chunk, groups, workers)
+        else:
+            # Cells run in parallel, chunks in order within a cell
+            chunk_results = run_tasks(
+                checkpointed_chunks,
+                [
+                    (checkpoint_path(checkpoint_dir, "coverage", group),
+                     coverage_chunk, group)
+                    for group in groups
+                ],
+                workers,
+            )
+
+        results = [merge_coverage(chunks, reps) for chunks in chunk_results]
+
+    else:
+        fn, tasks = checkpointed_tasks(
+            checkpoint_dir, "coverage", coverage_experiment,
+            [
+                (gen, true_mean, n, 0, False, reps)
+                for n in sizes
+                for _, gen, true_mean in distributions
+            ],
         )
+        results = run_tasks(fn, tasks, workers)
+
+    records = []
+
+    for (name, n), (coverage, width) in zip(cells, results):
         records.append({
-            "distribution": "mixture",
+            "distribution": name,
             "n": n,
             "coverage": coverage,
             "avg_ci_width": width,
         })
 
-    return pd.DataFrame.from_records(records)
+    with stage("aggregate"):
+        return pd.DataFrame.from_records(records)
 
 
 if __name__ == "__main__":
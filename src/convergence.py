@@ -1,31 +1,56 @@
 import numpy as np
-import pandas as pd
 
-from distributions import (
-    generate_normal,
-    generate_lognormal,
-    generate_student_t,
-    generate_mixture,
-)
+from distributions import DISTRIBUTIONS, prefix_safe
+from estimation import nested_mean_and_variance
+from moments import stream_moments
+from profiling import stage, staged
 
 SAMPLE_SIZES = [50, 200, 500, 1000, 5000]
 
 
-def track_mean_convergence(generator_fn, true_mean, seed=0):
+def track_mean_convergence(generator_fn, true_mean, seed=0, nested=False,
+                           sizes=None, streaming=False, workers=None):
     """
     For a single distribution, track how the sample mean evolves
-    as sample size increases.
+    as sample size increases through sizes.
+
+    nested=True draws one sample at the largest n and reads every
+    smaller n off as a prefix, via one cumulative reduction.
+    streaming=True grows one sample in memory-bounded blocks with
+    moments.stream_moments (spread over workers processes) and reads
+    the mean at each n, so sizes can go far beyond what fits in
+    memory (e.g. n = 10**9); it takes precedence over nested.
 
     Returns:
         pandas DataFrame with columns:
         ['n', 'sample_mean', 'true_mean', 'absolute_error']
     """
+    import pandas as pd
+
+    sizes = SAMPLE_SIZES if sizes is None else sizes
+
     records = []
 
-    for n in SAMPLE_SIZES:
-        samples, _, _ = generator_fn(n, seed=seed)
+    if streaming:
+        accumulators = stream_moments(generator_fn, sizes, seed=seed,
+                                      workers=workers)
+    elif nested:
+        with stage("generate", n=max(sizes)):
+            samples, _, _ = prefix_safe(generator_fn)(max(sizes), seed=seed)
+        with stage("statistic", n=max(sizes)):
+            prefix_means, _ = nested_mean_and_variance(samples, sizes)
+
+    for i, n in enumerate(sizes):
+        if streaming:
+            sample_mean = float(accumulators[i].mean)
+        elif nested:
+            sample_mean = float(prefix_means[i])
+        else:
+            with stage("generate", n=n):
+                samples, _, _ = generator_fn(n, seed=seed)
+            with stage("statistic", n=n):
+                sample_mean = float(np.mean(samples))
 
-        sample_mean = float(np.mean(samples))
         abs_error = abs(sample_mean - true_mean)
 
         records.append({
@@ -35,47 +60,41 @@ def track_mean_convergence(generator_fn, true_mean, seed=0):
             "absolute_error": abs_error,
         })
 
-    return pd.DataFrame.from_records(records)
+    with stage("aggregate"):
+        return pd.DataFrame.from_records(records)
 
 
-def run_convergence_experiment():
+@staged("convergence_experiment")
+def run_convergence_experiment(nested=False, sizes=None,
+                               distributions=DISTRIBUTIONS, streaming=False,
+                               workers=None):
     """
-    Run convergence tracking for all four distributions.
+    Run convergence tracking for every distribution
+    (the four of distributions.DISTRIBUTIONS by default).
+
+    nested=True uses the prefix-reuse design of track_mean_convergence,
+    streaming=True its bounded-memory streaming design, with the
+    streamed blocks spread over workers processes.
 
     Returns:
         pandas DataFrame with a column 'distribution' added.
     """
+    import pandas as pd
+
+    sizes = SAMPLE_SIZES if sizes is None else sizes
+
     frames = []
 
-    # ---- Normal ----
-    df_norm = track_mean_convergence(
-        generate_normal, true_mean=0.0, seed=0
-    )
-    df_norm["distribution"] = "normal"
-    frames.append(df_norm)
-
-    # ---- Lognormal ----
-    df_lognorm = track_mean_convergence(
-        generate_lognormal, true_mean=np.exp(0.5), seed=0
-    )
-    df_lognorm["distribution"] = "lognormal"
-    frames.append(df_lognorm)
-
-    # ---- Student-t ----
-    df_t = track_mean_convergence(
-        generate_student_t, true_mean=0.0, seed=0
-    )
-    df_t["distribution"] = "student_t"
-    frames.append(df_t)
-
-    # ---- Mixture ----
-    df_mix = track_mean_convergence(
-        generate_mixture, true_mean=0.0, seed=0
-    )
-    df_mix["distribution"] = "mixture"
-    frames.append(df_mix)
-
-    return pd.concat(frames, ignore_index=True)
+    for name, gen, true_mean in distributions:
+        df = track_mean_convergence(
+            gen, true_mean=true_mean, seed=0, nested=nested, sizes=sizes,
+            streaming=streaming, workers=workers,
+        )
+        df["distribution"] = name
+        frames.append(df)
+
+    with stage("aggregate"):
+        return pd.concat(frames, ignore_index=True)
 
 
 if __name__ == "__main__":
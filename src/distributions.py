@@ -1,41 +1,69 @@
+import functools
+
 import numpy as np
 
 
-def generate_normal(n, seed=42):
+MAX_BLOCK_ELEMENTS = 2_000_000   # cap on reps * n drawn in one batched call
+
+
+def replicate_chunks(n_reps, n, max_elements=MAX_BLOCK_ELEMENTS):
+    """
+    Split n_reps replicates of size n into consecutive blocks
+    that each hold at most max_elements values (at least one row).
+
+    The split depends only on (n_reps, n), so results built
+    chunk by chunk are reproducible.
+
+    Returns:
+        list of (start, stop) replicate index pairs
+    """
+    rows = max(1, max_elements // n)
+    return [
+        (start, min(start + rows, n_reps))
+        for start in range(0, n_reps, rows)
+    ]
+
+
+def _sample_shape(n, reps):
+    """Shape of one draw: (n,) for a single sample, (reps, n) for a batch."""
+    return n if reps is None else (reps, n)
+
+
+def generate_normal(n, seed=42, reps=None):
     """
     Generate samples from a standard normal distribution.
 
+    If reps is given, draw reps independent samples of size n
+    in one call instead of a single sample.
+
     Returns:
-        samples: numpy array of shape (n,)
+        samples: numpy array of shape (n,), or (reps, n) if reps is given
         true_mean: float
         true_variance: float
     """
     rng = np.random.default_rng(seed)
 
-    samples = rng.normal(loc=0.0, scale=1.0, size=n)
+    samples = rng.normal(loc=0.0, scale=1.0, size=_sample_shape(n, reps))
     true_mean = 0.0
     true_variance = 1.0
 
     return samples, true_mean, true_variance
 
 
-def generate_lognormal(n, seed=42):
+def generate_lognormal(n, seed=42, reps=None, mu=0.0, sigma=1.0):
     """
     Generate samples from a lognormal distribution.
 
-    We generate X ~ LogNormal(mu=0, sigma=1).
+    We generate X ~ LogNormal(mu, sigma), by default mu=0, sigma=1.
 
     Returns:
-        samples: numpy array of shape (n,)
+        samples: numpy array of shape (n,), or (reps, n) if reps is given
         true_mean: float
         true_variance: float
     """
     rng = np.random.default_rng(seed)
 
-    mu = 0.0
-    sigma = 1.0
-
-    samples = rng.lognormal(mean=mu, sigma=sigma, size=n)
+    samples = rng.lognormal(mean=mu, sigma=sigma, size=_sample_shape(n, reps))
 
     # True mean and variance of lognormal distribution
     true_mean = np.exp(mu + (sigma**2) / 2)
@@ -44,20 +72,20 @@ def generate_lognormal(n, seed=42):
     return samples, true_mean, true_variance
 
 
-def generate_student_t(n, df=4, seed=42):
+def generate_student_t(n, df=4, seed=42, reps=None):
     """
     Generate samples from a Student-t distribution.
 
     df=4 gives heavy tails while keeping finite variance.
 
     Returns:
-        samples: numpy array of shape (n,)
+        samples: numpy array of shape (n,), or (reps, n) if reps is given
         true_mean: float
         true_variance: float
     """
     rng = np.random.default_rng(seed)
 
-    samples = rng.standard_t(df=df, size=n)
+    samples = rng.standard_t(df=df, size=_sample_shape(n, reps))
 
     # For Student-t:
     # Mean = 0 (if df > 1)
@@ -68,13 +96,17 @@ def generate_student_t(n, df=4, seed=42):
     return samples, true_mean, true_variance
 
 
-def generate_mixture(n, seed=42):
+def generate_mixture(n, seed=42, reps=None, interleaved=False):
     """
     Generate a bimodal Gaussian mixture:
     50% from N(-2, 1) and 50% from N(2, 1).
 
+    By default the N(-2, 1) draws come first. interleaved=True
+    alternates the components instead, so every prefix of the
+    sample keeps the 50/50 split.
+
     Returns:
-        samples: numpy array of shape (n,)
+        samples: numpy array of shape (n,), or (reps, n) if reps is given
         true_mean: float
         true_variance: float
     """
@@ -83,10 +115,18 @@ def generate_mixture(n, seed=42):
     n1 = n // 2
     n2 = n - n1
 
-    samples1 = rng.normal(loc=-2.0, scale=1.0, size=n1)
-    samples2 = rng.normal(loc=2.0, scale=1.0, size=n2)
+    # Leading batch dimension, empty for a single sample
+    lead = () if reps is None else (reps,)
 
-    samples = np.concatenate([samples1, samples2])
+    samples1 = rng.normal(loc=-2.0, scale=1.0, size=lead + (n1,))
+    samples2 = rng.normal(loc=2.0, scale=1.0, size=lead + (n2,))
+
+    if interleaved:
+        samples = np.empty(lead + (n,))
+        samples[..., 1::2] = samples1
+        samples[..., 0::2] = samples2
+    else:
+        samples = np.concatenate([samples1, samples2], axis=-1)
 
     # True mean of symmetric mixture is 0
     true_mean = 0.0
@@ -97,3 +137,56 @@ def generate_mixture(n, seed=42):
     true_variance = 1.0 + 4.0
 
     return samples, true_mean, true_variance
+
+
+def prefix_safe(generator_fn):
+    """
+    Return a version of generator_fn whose samples remain valid
+    draws when cut down to any prefix, as the nested design needs.
+    """
+    if generator_fn is generate_mixture:
+        return functools.partial(generate_mixture, interleaved=True)
+    return generator_fn
+
+
+# Name, generator and true mean of each data-generating process
+DISTRIBUTIONS = [
+    ("normal", generate_normal, 0.0),
+    ("lognormal", generate_lognormal, np.exp(0.5)),
+    ("student_t", generate_student_t, 0.0),
+    ("mixture", generate_mixture, 0.0),
+]
+
+GENERATORS = {
+    "normal": generate_normal,
+    "lognormal": generate_lognormal,
+    "student_t": generate_student_t,
+    "mixture": generate_mixture,
+}
+
+
+def make_distribution(name, **params):
+    """
+    Build a DISTRIBUTIONS entry from a generator name and optional
+    generator parameters, e.g. make_distribution("student_t", df=3).
+
+    The true mean is read off the generator itself. Entries with
+    parameters are labelled with them, e.g. "student_t(df=3)".
+
+    Returns:
+        (label, generator_fn, true_mean)
+    """
+    if name not in GENERATORS:
+        raise ValueError(f"unknown distribution {name!r}; "
+                         f"choose from {', '.join(GENERATORS)}")
+
+    generator_fn = GENERATORS[name]
+    label = name
+
+    if params:
+        generator_fn = functools.partial(generator_fn, **params)
+        args = ", ".join(f"{k}={v}" for k, v in sorted(params.items()))
+        label = f"{name}({args})"
+
+    _, true_mean, _ = generator_fn(1, seed=0)
+    return label, generator_fn, true_mean
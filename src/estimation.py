@@ -1,12 +1,10 @@
 import numpy as np
-import pandas as pd
 
-from distributions import (
-    generate_normal,
-    generate_lognormal,
-    generate_student_t,
-    generate_mixture,
-)
+from distributions import DISTRIBUTIONS, replicate_chunks
+from moments import MomentAccumulator
+from parallel import run_tasks
+from profiling import stage, staged
+from streams import cell_key, chunk_seed, generator_name
 
 
 SAMPLE_SIZES = [50, 200, 500, 1000, 5000]
@@ -15,91 +13,144 @@ SAMPLE_SIZES = [50, 200, 500, 1000, 5000]
 def estimate_mean_and_variance(samples):
     """
     Compute sample mean and sample variance (unbiased).
+
+    samples may also be a moments.MomentAccumulator (e.g. from
+    moments.stream_moments) for samples too large to hold in memory.
     """
+    if isinstance(samples, MomentAccumulator):
+        return float(samples.mean), float(samples.variance())
+
     sample_mean = float(np.mean(samples))
     sample_variance = float(np.var(samples, ddof=1))
     return sample_mean, sample_variance
 
 
-def run_estimation_experiment():
+def sampling_distribution(generator_fn, n, reps, seed=0):
+    """
+    Sampling distribution of the mean: the means and unbiased
+    variances of reps independent samples of size n, drawn in
+    memory-bounded (reps, n) chunks.
+
+    Results are not memoized: callers that need several statistics
+    of the same replicates compute them once and pass the arrays on
+    (see runner.shared_cell).
+
+    Returns:
+        means: numpy array of shape (reps,)
+        variances: numpy array of shape (reps,)
+    """
+    cell = cell_key("sampling-distribution", generator_name(generator_fn), n)
+    means = np.empty(reps)
+    variances = np.empty(reps)
+
+    for start, stop in replicate_chunks(reps, n):
+        with stage("generate", n=n, reps=stop - start):
+            block, _, _ = generator_fn(
+                n, seed=chunk_seed(cell, start, seed=seed), reps=stop - start
+            )
+
+        with stage("statistic", n=n, reps=stop - start):
+            means[start:stop] = np.mean(block, axis=1)
+            variances[start:stop] = np.var(block, axis=1, ddof=1)
+
+    return means, variances
+
+
+def nested_mean_and_variance(samples, sizes):
+    """
+    Sample mean and unbiased variance of every prefix
+    samples[..., :m] for m in sizes, in one pass. sizes may come in
+    any order and repeat; results follow the order given.
+
+    Segment sums and sums of squares between consecutive sizes
+    are accumulated, so each prefix costs no extra pass over the
+    data. Values are shifted by the first observation of each
+    sample to avoid cancellation in the sum of squares.
+
+    Args:
+        samples: array of shape (n,) or (reps, n) with n >= max(sizes)
+        sizes: prefix lengths
+
+    Returns:
+        means: array of shape (..., len(sizes))
+        variances: array of shape (..., len(sizes))
+    """
+    # reduceat needs distinct ascending segment starts
+    sizes, order = np.unique(sizes, return_inverse=True)
+    shift = samples[..., :1]
+    d = samples[..., :sizes[-1]] - shift
+
+    starts = np.concatenate([[0], sizes[:-1]])
+    s1 = np.cumsum(np.add.reduceat(d, starts, axis=-1), axis=-1)
+    s2 = np.cumsum(np.add.reduceat(d * d, starts, axis=-1), axis=-1)
+
+    means = shift + s1 / sizes
+    variances = (s2 - s1 * s1 / sizes) / (sizes - 1)
+    return np.take(means, order, axis=-1), np.take(variances, order, axis=-1)
+
+
+def estimation_cell(generator_fn, n):
+    """
+    Draw one sample of size n and compare its estimates
+    to the true mean and variance.
+
+    Returns:
+        dict with every results column except 'distribution'
+    """
+    with stage("generate", n=n):
+        x, true_mean, true_var = generator_fn(n)
+    with stage("statistic", n=n):
+        sm, sv = estimate_mean_and_variance(x)
+
+    return {
+        "n": n,
+        "sample_mean": sm,
+        "true_mean": true_mean,
+        "mean_bias": sm - true_mean,
+        "sample_variance": sv,
+        "true_variance": true_var,
+        "variance_error": sv - true_var,
+    }
+
+
+@staged("estimation_experiment")
+def run_estimation_experiment(workers=None, sizes=None,
+                              distributions=DISTRIBUTIONS):
     """
     For each distribution and each sample size:
       - draw one sample
       - compute sample mean and variance
       - compare to true values
 
+    workers > 1 evaluates the grid cells in a process pool.
+    sizes and distributions override the default grid.
+
     Returns:
         results_df: pandas DataFrame with columns:
         ['distribution', 'n', 'sample_mean', 'true_mean',
          'mean_bias', 'sample_variance', 'true_variance',
          'variance_error']
     """
+    import pandas as pd
 
-    records = []
+    sizes = SAMPLE_SIZES if sizes is None else sizes
 
-    for n in SAMPLE_SIZES:
+    cells = [
+        (name, gen, n)
+        for n in sizes
+        for name, gen, _ in distributions
+    ]
+    results = run_tasks(
+        estimation_cell, [(gen, n) for _, gen, n in cells], workers
+    )
 
-        # ---- Normal ----
-        x, true_mean, true_var = generate_normal(n)
-        sm, sv = estimate_mean_and_variance(x)
-
-        records.append({
-            "distribution": "normal",
-            "n": n,
-            "sample_mean": sm,
-            "true_mean": true_mean,
-            "mean_bias": sm - true_mean,
-            "sample_variance": sv,
-            "true_variance": true_var,
-            "variance_error": sv - true_var,
-        })
-
-        # ---- Lognormal ----
-        x, true_mean, true_var = generate_lognormal(n)
-        sm, sv = estimate_mean_and_variance(x)
-
-        records.append({
-            "distribution": "lognormal",
-            "n": n,
-            "sample_mean": sm,
-            "true_mean": true_mean,
-            "mean_bias": sm - true_mean,
-            "sample_variance": sv,
-            "true_variance": true_var,
-            "variance_error": sv - true_var,
-        })
-
-        # ---- Student-t ----
-        x, true_mean, true_var = generate_student_t(n)
-        sm, sv = estimate_mean_and_variance(x)
+    records = []
 
-        records.append({
-            "distribution": "student_t",
-            "n": n,
-            "sample_mean": sm,
-            "true_mean": true_mean,
-            "mean_bias": sm - true_mean,
-            "sample_variance": sv,
-            "true_variance": true_var,
-            "variance_error": sv - true_var,
-        })
-
-        # ---- Mixture ----
-        x, true_mean, true_var = generate_mixture(n)
-        sm, sv = estimate_mean_and_variance(x)
+    for (name, _, _), cell in zip(cells, results):
+        records.append({"distribution": name, **cell})
 
-        records.append({
-            "distribution": "mixture",
-            "n": n,
-            "sample_mean": sm,
-            "true_mean": true_mean,
-            "mean_bias": sm - true_mean,
-            "sample_variance": sv,
-            "true_variance": true_var,
-            "variance_error": sv - true_var,
-        })
-
-    results_df = pd.DataFrame.from_records(records)
+    with stage("aggregate"):
+        results_df = pd.DataFrame.from_records(records)
     return results_df
 
 
@@ -0,0 +1,160 @@
+import numpy as np
+
+
+def _log_joint(x, weights, means, variances):
+    """log(w_j) + log N(x | mu_j, var_j), shape (..., n, k)."""
+    x = x[..., :, None]
+    mu = means[..., None, :]
+    var = variances[..., None, :]
+    return (
+        np.log(weights)[..., None, :]
+        - 0.5 * np.log(2 * np.pi * var)
+        - (x - mu) ** 2 / (2 * var)
+    )
+
+
+def _kmeans_plus_plus(x, k, rng):
+    """
+    k-means++ seeding for every row of a (reps, n) block: the first
+    center is a random point, each further one is drawn with
+    probability proportional to squared distance to the nearest
+    center chosen so far.
+
+    Returns:
+        centers: array of shape (reps, k)
+    """
+    reps, n = x.shape
+    rows = np.arange(reps)
+    centers = np.empty((reps, k))
+
+    centers[:, 0] = x[rows, rng.integers(0, n, size=reps)]
+    d2 = (x - centers[:, :1]) ** 2
+
+    for j in range(1, k):
+        cum = np.cumsum(d2, axis=1)
+        u = rng.random(reps) * cum[:, -1]
+        idx = np.minimum(np.sum(cum < u[:, None], axis=1), n - 1)
+
+        centers[:, j] = x[rows, idx]
+        d2 = np.minimum(d2, (x - centers[:, j:j + 1]) ** 2)
+
+    return centers
+
+
+def _lloyd(x, centers, n_iter=10):
+    """
+    Refine (reps, k) centers with a few vectorized k-means steps.
+
+    Returns:
+        centers: array of shape (reps, k)
+        labels: nearest-center index of each point, shape (reps, n)
+    """
+    k = centers.shape[1]
+
+    for _ in range(n_iter):
+        labels = np.argmin(np.abs(x[:, :, None] - centers[:, None, :]), axis=2)
+        onehot = labels[:, :, None] == np.arange(k)
+        counts = np.sum(onehot, axis=1)
+        sums = np.einsum("rnk,rn->rk", onehot, x)
+        # keep the old center for any cluster that went empty
+        centers = np.where(counts > 0, sums / np.maximum(counts, 1), centers)
+
+    labels = np.argmin(np.abs(x[:, :, None] - centers[:, None, :]), axis=2)
+    return centers, labels
+
+
+def fit_gmm_1d(x, k=2, init=None, max_iter=200, tol=1e-6, reg_var=1e-6,
+               seed=0):
+    """
+    Fit a k-component 1-D Gaussian mixture by EM.
+
+    x may be one sample of shape (n,) or a (reps, n) block; every
+    row of a block is fitted independently but in the same array
+    operations. Without init, EM starts from a k-means clustering
+    seeded with k-means++. init=(weights, means, variances), each of
+    shape (..., k), warm-starts EM instead, e.g. from the fit of a
+    neighbouring sample.
+
+    Components are returned ordered by mean.
+
+    Returns:
+        dict with
+        'weights', 'means', 'variances': arrays of shape (..., k)
+        'labels': most likely component of each point, shape of x
+        'log_likelihood': mean log-likelihood per point, shape (...)
+        'n_iter': number of EM iterations run
+    """
+    x = np.asarray(x, dtype=float)
+    single = x.ndim == 1
+    if single:
+        x = x[None, :]
+    reps, n = x.shape
+
+    if init is None:
+        rng = np.random.default_rng(seed)
+        means, labels = _lloyd(x, _kmeans_plus_plus(x, k, rng))
+
+        onehot = labels[:, :, None] == np.arange(k)
+        counts = np.maximum(np.sum(onehot, axis=1), 1)
+        sq = (x[:, :, None] - means[:, None, :]) ** 2
+        weights = counts / n
+        variances = np.einsum("rnk,rnk->rk", onehot, sq) / counts + reg_var
+    else:
+        weights, means, variances = (
+            np.broadcast_to(np.asarray(p, dtype=float), (reps, k)).copy()
+            for p in init
+        )
+
+    ll = np.full(reps, -np.inf)
+    active = np.arange(reps)   # rows that have not converged yet
+
+    for n_iter in range(1, max_iter + 1):
+        xa = x[active]
+
+        # ---- E-step ----
+        log_joint = _log_joint(
+            xa, weights[active], means[active], variances[active]
+        )
+        top = np.max(log_joint, axis=2, keepdims=True)
+        log_norm = top + np.log(
+            np.sum(np.exp(log_joint - top), axis=2, keepdims=True)
+        )
+        resp = np.exp(log_joint - log_norm)
+        new_ll = np.mean(log_norm[..., 0], axis=1)
+
+        # ---- M-step ----
+        nk = np.sum(resp, axis=1) + 10 * np.finfo(float).eps
+        mu = np.einsum("rnk,rn->rk", resp, xa) / nk
+        sq = (xa[:, :, None] - mu[:, None, :]) ** 2
+
+        weights[active] = nk / n
+        means[active] = mu
+        variances[active] = np.einsum("rnk,rnk->rk", resp, sq) / nk + reg_var
+
+        converged = np.abs(new_ll - ll[active]) < tol
+        ll[active] = new_ll
+        active = active[~converged]
+
+        if active.size == 0:
+            break
+
+    order = np.argsort(means, axis=1)
+    weights = np.take_along_axis(weights, order, axis=1)
+    means = np.take_along_axis(means, order, axis=1)
+    variances = np.take_along_axis(variances, order, axis=1)
+    labels = np.argmax(_log_joint(x, weights, means, variances), axis=2)
+
+    result = {
+        "weights": weights,
+        "means": means,
+        "variances": variances,
+        "labels": labels,
+        "log_likelihood": ll,
+        "n_iter": n_iter,
+    }
+    if single:
+        result = {
+            key: value[0] if isinstance(value, np.ndarray) else value
+            for key, value in result.items()
+        }
+    return result
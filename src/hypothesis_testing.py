@@ -1,108 +1,384 @@
+import functools
+
 import numpy as np
-import pandas as pd
-from scipy import stats
 
+from checkpoint import checkpoint_path, checkpointed_chunks, checkpointed_tasks
 from distributions import (
-    generate_normal,
-    generate_lognormal,
-    generate_student_t,
-    generate_mixture,
+    replicate_chunks,
+    prefix_safe,
+    DISTRIBUTIONS,
 )
+from estimation import nested_mean_and_variance
+from moments import MomentAccumulator
+from parallel import run_tasks, run_grouped
+from profiling import stage, staged
+from sequential import run_until_precise
+from streams import cell_key, chunk_seed, generator_name
 
 SAMPLE_SIZES = [50, 200, 500, 1000, 5000]
 N_REPLICATES = 1000      # repeated experiments per setting
 ALPHA = 0.05             # 5% significance level
 
 
-def run_one_sample_ttest(samples, mu0):
+def run_one_sample_ttest(samples, mu0, alpha=None):
     """
     Classical one-sample t-test:
     H0: mean = mu0
     H1: mean != mu0
 
+    samples may also be a moments.MomentAccumulator, so a sample
+    streamed in chunks can be tested without holding it in memory.
+
     Returns:
         p_value: float
         reject: bool (True if H0 rejected)
     """
-    t_stat, p_value = stats.ttest_1samp(samples, popmean=mu0)
-    reject = p_value < ALPHA
+    from scipy import stats
+
+    alpha = ALPHA if alpha is None else alpha
+
+    if isinstance(samples, MomentAccumulator):
+        _, p_value = ttest_from_moments(
+            samples.mean, samples.variance(), samples.count, mu0
+        )
+    else:
+        _, p_value = stats.ttest_1samp(samples, popmean=mu0)
+
+    reject = p_value < alpha
     return float(p_value), bool(reject)
 
 
-def type_i_error_experiment(generator_fn, true_mean, n, seed_start=0):
+def batched_ttest(block, mu0):
+    """
+    One-sample t-test for every row of a (reps, n) block at once.
+
+    Same statistic and two-sided p-value as stats.ttest_1samp,
+    computed directly from the Student-t survival function to
+    skip SciPy's per-call validation and result objects.
+    block may also be a MomentAccumulator of shape (reps,).
+
+    Returns:
+        t_stats: numpy array of shape (reps,)
+        p_values: numpy array of shape (reps,)
+    """
+    if isinstance(block, MomentAccumulator):
+        return ttest_from_moments(block.mean, block.variance(), block.count,
+                                  mu0)
+
+    n = block.shape[1]
+    sample_mean = np.mean(block, axis=1)
+    sample_variance = np.var(block, axis=1, ddof=1)
+
+    return ttest_from_moments(sample_mean, sample_variance, n, mu0)
+
+
+def ttest_from_moments(sample_mean, sample_variance, n, mu0):
+    """
+    One-sample t statistic and two-sided p-value from precomputed
+    moments. Works elementwise on scalars or arrays.
+
+    Returns:
+        t_stat, p_value
+    """
+    from scipy import stats
+
+    t_stat = (sample_mean - mu0) / np.sqrt(sample_variance / n)
+    p_value = 2.0 * stats.t.sf(np.abs(t_stat), df=n - 1)
+    return t_stat, p_value
+
+
+def rejection_chunk(generator_fn, true_mean, n, reps, seed, alpha=None):
+    """
+    Draw one (reps, n) block and t-test every replicate at level alpha.
+
+    Returns:
+        rejections: number of replicates where H0 was rejected
+    """
+    alpha = ALPHA if alpha is None else alpha
+
+    with stage("generate", n=n, reps=reps):
+        block, _, _ = generator_fn(n, seed=seed, reps=reps)
+
+    with stage("statistic", n=n, reps=reps):
+        _, p_values = batched_ttest(block, mu0=true_mean)
+        return int(np.sum(p_values < alpha))
+
+
+def rejection_tasks(generator_fn, true_mean, n, seed_start=0,
+                    reps=None, alpha=None):
+    """
+    Split one cell's reps replicates into rejection_chunk calls,
+    one per memory-bounded replicate chunk.
+
+    Returns:
+        list of argument tuples for rejection_chunk
+    """
+    reps = N_REPLICATES if reps is None else reps
+    alpha = ALPHA if alpha is None else alpha
+
+    cell = cell_key("ttest", generator_name(generator_fn), n)
+    return [
+        (generator_fn, true_mean, n, stop - start,
+         chunk_seed(cell, start, seed=seed_start), alpha)
+        for start, stop in replicate_chunks(reps, n)
+    ]
+
+
+def merge_rejections(chunk_results, reps=None):
+    """
+    Combine rejection_chunk counts into the Type I error rate
+    of a cell of reps replicates.
+    """
+    reps = N_REPLICATES if reps is None else reps
+
+    return sum(chunk_results) / reps
+
+
+def type_i_error_experiment(generator_fn, true_mean, n, seed_start=0,
+                            vectorized=False, reps=None, alpha=None):
     """
     Estimate empirical Type I error rate:
     - We simulate data where H0 is TRUE
     - We see how often the t-test incorrectly rejects H0
 
+    vectorized=True tests whole (reps, n) blocks along axis 1,
+    chunked like confidence_intervals.coverage_experiment, with
+    one independent stream per chunk rooted at seed_start.
+    reps is the number of repeated experiments, alpha the
+    significance level.
+
     Returns:
         type_i_rate: fraction of false rejections
     """
+    reps = N_REPLICATES if reps is None else reps
+    alpha = ALPHA if alpha is None else alpha
+
+    if vectorized:
+        return merge_rejections([
+            rejection_chunk(*args)
+            for args in rejection_tasks(generator_fn, true_mean, n, seed_start,
+                                        reps, alpha)
+        ], reps)
+
     rejections = []
 
-    for i in range(N_REPLICATES):
-        samples, _, _ = generator_fn(n, seed=seed_start + i)
-        _, reject = run_one_sample_ttest(samples, mu0=true_mean)
+    for i in range(reps):
+        with stage("generate", n=n):
+            samples, _, _ = generator_fn(n, seed=seed_start + i)
+        with stage("statistic", n=n):
+            _, reject = run_one_sample_ttest(samples, mu0=true_mean,
+                                             alpha=alpha)
         rejections.append(reject)
 
     return float(np.mean(rejections))
 
 
-def run_testing_experiment():
+def type_i_error_from_moments(means, variances, n, true_mean, alpha=None):
+    """
+    Type I error rate of replicates given by their means and unbiased
+    variances, the t-test counterpart of
+    confidence_intervals.coverage_from_moments.
+
+    Returns:
+        type_i_rate: fraction of false rejections
+    """
+    alpha = ALPHA if alpha is None else alpha
+
+    with stage("statistic", n=n, reps=len(means)):
+        _, p_values = ttest_from_moments(means, variances, n, true_mean)
+        return float(np.mean(p_values < alpha))
+
+
+def adaptive_type_i_error_experiment(generator_fn, true_mean, n, tol,
+                                     seed_start=0, alpha=None,
+                                     checkpoint=None):
+    """
+    Sequential version of type_i_error_experiment: replicate batches
+    are drawn only until the binomial standard error of the Type I
+    error estimate falls below tol.
+
+    checkpoint is an optional file that saves the running totals
+    after every batch (see sequential.run_until_precise).
+
+    Returns:
+        type_i_rate: fraction of false rejections
+        replicates: number of replicates used
+    """
+    alpha = ALPHA if alpha is None else alpha
+
+    cell = cell_key("ttest", generator_name(generator_fn), n)
+    chunk_fn = functools.partial(
+        rejection_chunk, generator_fn, true_mean, n, alpha=alpha
+    )
+
+    (rejected,), done = run_until_precise(
+        chunk_fn, n, cell, tol, seed_start=seed_start, checkpoint=checkpoint
+    )
+    return rejected / done, done
+
+
+def nested_type_i_error_experiment(generator_fn, true_mean, sizes,
+                                   seed_start=0, reps=None,
+                                   alpha=None):
+    """
+    Nested design: each replicate is drawn once at max(sizes) and
+    every smaller n is tested on a prefix of the same sample.
+    sizes may come in any order (results follow it); the draws
+    depend only on the set of sizes.
+
+    Returns:
+        list of Type I error rates, one per entry of sizes
+    """
+    reps = N_REPLICATES if reps is None else reps
+    alpha = ALPHA if alpha is None else alpha
+
+    cell = cell_key(
+        "ttest-nested", generator_name(generator_fn),
+        tuple(sorted(set(int(m) for m in sizes))),
+    )
+    generator_fn = prefix_safe(generator_fn)
+    sizes = np.asarray(sizes)
+    n_max = int(sizes.max())
+
+    rejected = np.zeros(len(sizes), dtype=int)
+
+    for start, stop in replicate_chunks(reps, n_max):
+        with stage("generate", n=n_max, reps=stop - start):
+            block, _, _ = generator_fn(
+                n_max, seed=chunk_seed(cell, start, seed=seed_start),
+                reps=stop - start,
+            )
+
+        with stage("statistic", n=n_max, reps=stop - start):
+            means, variances = nested_mean_and_variance(block, sizes)
+            _, p_values = ttest_from_moments(means, variances, sizes,
+                                             true_mean)
+            rejected += np.sum(p_values < alpha, axis=0)
+
+    return [r / reps for r in rejected]
+
+
+@staged("testing_experiment")
+def run_testing_experiment(vectorized=False, nested=False, workers=None,
+                           tol=None, sizes=None, reps=None,
+                           distributions=DISTRIBUTIONS, alpha=None,
+                           checkpoint_dir=None):
     """
     For each distribution and sample size,
     estimate the empirical Type I error rate
     of the classical t-test.
 
+    vectorized=True uses the batched (reps, n) t-test path.
+    nested=True reuses one draw per replicate across all sizes
+    (see nested_type_i_error_experiment).
+    workers > 1 spreads grid cells (and, when vectorized, the
+    replicate chunks inside each cell) over a process pool;
+    the results do not depend on the worker count.
+    tol switches to adaptive replicate counts (see
+    adaptive_type_i_error_experiment) and adds a 'replicates' column.
+    It takes precedence: vectorized, nested and reps are then
+    ignored.
+    sizes, reps, distributions and alpha override the default grid
+    (SAMPLE_SIZES, N_REPLICATES and ALPHA, read at call time; see
+    confidence_intervals.run_coverage_experiment), and
+    checkpoint_dir makes the run resumable in the same way.
+
     Returns:
         DataFrame with columns:
         ['distribution', 'n', 'type_i_error']
     """
-    records = []
+    import pandas as pd
 
-    for n in SAMPLE_SIZES:
+    sizes = SAMPLE_SIZES if sizes is None else sizes
+    reps = N_REPLICATES if reps is None else reps
+    alpha = ALPHA if alpha is None else alpha
 
-        # ---- Normal (benchmark) ----
-        err = type_i_error_experiment(
-            generate_normal, true_mean=0.0, n=n
-        )
-        records.append({
-            "distribution": "normal",
-            "n": n,
-            "type_i_error": err,
-        })
+    cells = [(name, n) for n in sizes for name, _, _ in distributions]
 
-        # ---- Lognormal ----
-        err = type_i_error_experiment(
-            generate_lognormal, true_mean=np.exp(0.5), n=n
+    if tol is not None:
+        results = run_tasks(
+            adaptive_type_i_error_experiment,
+            [
+                (gen, true_mean, n, tol, 0, alpha,
+                 checkpoint_path(checkpoint_dir, "ttest", gen, n, tol, alpha)
+                 if checkpoint_dir else None)
+                for n in sizes
+                for _, gen, true_mean in distributions
+            ],
+            workers,
         )
-        records.append({
-            "distribution": "lognormal",
-            "n": n,
-            "type_i_error": err,
-        })
+        records = [
+            {
+                "distribution": name,
+                "n": n,
+                "type_i_error": err,
+                "replicates": reps,
+            }
+            for (name, n), (err, reps) in zip(cells, results)
+        ]
+        with stage("aggregate"):
+            return pd.DataFrame.from_records(records)
 
-        # ---- Student-t ----
-        err = type_i_error_experiment(
-            generate_student_t, true_mean=0.0, n=n
+    if nested:
+        fn, tasks = checkpointed_tasks(
+            checkpoint_dir, "ttest-nested", nested_type_i_error_experiment,
+            [
+                (gen, true_mean, sizes, 0, reps, alpha)
+                for _, gen, true_mean in distributions
+            ],
         )
-        records.append({
-            "distribution": "student_t",
-            "n": n,
-            "type_i_error": err,
-        })
+        per_dist = run_tasks(fn, tasks, workers)
+        results = [
+            per_dist[d][i]
+            for i in range(len(sizes))
+            for d in range(len(distributions))
+        ]
+
+    elif vectorized:
+        groups = [
+            rejection_tasks(gen, true_mean, n, reps=reps, alpha=alpha)
+            for n in sizes
+            for _, gen, true_mean in distributions
+        ]
 
-        # ---- Mixture ----
-        err = type_i_error_experiment(
-            generate_mixture, true_mean=0.0, n=n
+        if checkpoint_dir is None:
+            chunk_results = run_grouped(rejection_chunk, groups, workers)
+        else:
+            # Cells run in parallel, chunks in order within a cell
+            chunk_results = run_tasks(
+                checkpointed_chunks,
+                [
+                    (checkpoint_path(checkpoint_dir, "ttest", group),
+                     rejection_chunk, group)
+                    for group in groups
+                ],
+                workers,
+            )
+
+        results = [merge_rejections(chunks, reps) for chunks in chunk_results]
+
+    else:
+        fn, tasks = checkpointed_tasks(
+            checkpoint_dir, "ttest", type_i_error_experiment,
+            [
+                (gen, true_mean, n, 0, False, reps, alpha)
+                for n in sizes
+                for _, gen, true_mean in distributions
+            ],
         )
+        results = run_tasks(fn, tasks, workers)
+
+    records = []
+
+    for (name, n), err in zip(cells, results):
         records.append({
-            "distribution": "mixture",
+            "distribution": name,
             "n": n,
             "type_i_error": err,
         })
 
-    return pd.DataFrame.from_records(records)
+    with stage("aggregate"):
+        return pd.DataFrame.from_records(records)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,179 @@
+import numpy as np
+
+from distributions import MAX_BLOCK_ELEMENTS, prefix_safe
+from parallel import iter_tasks
+from profiling import stage
+from streams import cell_key, chunk_seed, generator_name
+
+
+class MomentAccumulator:
+    """
+    Running count, mean and central moment sums M2, M3, M4 of a
+    stream of observations, in O(1) memory whatever the sample size.
+
+    Each chunk passed to update() is reduced on its own (two-pass,
+    around the chunk mean) and folded in with the pairwise update of
+    Chan et al. / Pebay, which avoids the cancellation of raw power
+    sums. merge() combines accumulators built from disjoint parts of
+    a sample, e.g. by different workers.
+
+    shape is the batch shape: () for one sample, (reps,) to track
+    reps samples side by side. update() then takes arrays of shape
+    shape + (m,), reduced along the last axis.
+    """
+
+    def __init__(self, shape=()):
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+        self.m3 = np.zeros(shape)
+        self.m4 = np.zeros(shape)
+
+    @classmethod
+    def from_samples(cls, samples):
+        """Accumulator holding samples (shape (..., n)) in one chunk."""
+        samples = np.asarray(samples, dtype=float)
+        return cls(samples.shape[:-1]).update(samples)
+
+    def update(self, chunk):
+        """Add the observations in chunk (last axis). Returns self."""
+        chunk = np.asarray(chunk, dtype=float)
+        n = chunk.shape[-1]
+        if n == 0:
+            return self
+
+        mean = np.mean(chunk, axis=-1)
+        d = chunk - mean[..., None]
+        d2 = d * d
+
+        return self._combine(
+            n, mean,
+            np.sum(d2, axis=-1),
+            np.sum(d2 * d, axis=-1),
+            np.sum(d2 * d2, axis=-1),
+        )
+
+    def merge(self, other):
+        """Add the observations summarized by other. Returns self."""
+        if other.count == 0:
+            return self
+        return self._combine(other.count, other.mean, other.m2,
+                             other.m3, other.m4)
+
+    def _combine(self, nb, mean_b, m2_b, m3_b, m4_b):
+        na = self.count
+
+        if na == 0:
+            self.count = nb
+            self.mean = np.array(mean_b, dtype=float)
+            self.m2 = np.array(m2_b, dtype=float)
+            self.m3 = np.array(m3_b, dtype=float)
+            self.m4 = np.array(m4_b, dtype=float)
+            return self
+
+        n = na + nb
+        delta = mean_b - self.mean
+        d_n = delta / n
+        d_n2 = d_n * d_n
+
+        m4 = (self.m4 + m4_b
+              + delta * d_n2 * d_n * na * nb * (na * na - na * nb + nb * nb)
+              + 6 * d_n2 * (na * na * m2_b + nb * nb * self.m2)
+              + 4 * d_n * (na * m3_b - nb * self.m3))
+        m3 = (self.m3 + m3_b
+              + delta * d_n2 * na * nb * (na - nb)
+              + 3 * d_n * (na * m2_b - nb * self.m2))
+        m2 = self.m2 + m2_b + delta * d_n * na * nb
+
+        self.count = n
+        self.mean = self.mean + nb * d_n
+        self.m2, self.m3, self.m4 = m2, m3, m4
+        return self
+
+    def variance(self, ddof=1):
+        """Sample variance (unbiased by default, like np.var(ddof=1))."""
+        return self.m2 / (self.count - ddof)
+
+    def skewness(self):
+        """Sample skewness g1 (as scipy.stats.skew with bias=True)."""
+        return np.sqrt(self.count) * self.m3 / self.m2 ** 1.5
+
+    def kurtosis(self):
+        """Excess kurtosis g2 (as scipy.stats.kurtosis with bias=True)."""
+        return self.count * self.m4 / (self.m2 * self.m2) - 3.0
+
+
+def block_moments(generator_fn, cell, k, step, seed=0, reps=None):
+    """
+    Moments of block k of a stream: positions [k * step, (k + 1) * step)
+    drawn from streams.chunk_seed(cell, k * step, seed).
+
+    Returns:
+        MomentAccumulator with count step
+    """
+    block = _draw_block(generator_fn, cell, k, step, seed, reps)
+    with stage("statistic", n=step, block=k):
+        return MomentAccumulator.from_samples(block)
+
+
+def _draw_block(generator_fn, cell, k, step, seed, reps):
+    # prefix_safe keeps the mixture's 50/50 split in every slice of a block
+    with stage("generate", n=step, block=k):
+        block, _, _ = prefix_safe(generator_fn)(
+            step, seed=chunk_seed(cell, k * step, seed=seed), reps=reps
+        )
+    return block
+
+
+def stream_moments(generator_fn, sizes, seed=0, reps=None, workers=None,
+                   max_elements=MAX_BLOCK_ELEMENTS):
+    """
+    Moments of one sample (or reps samples side by side) grown to
+    every n in sizes (ascending), e.g. n = 10**9, in O(1) memory.
+
+    The sample is cut into fixed blocks of max_elements // reps
+    values, each drawn, folded into a MomentAccumulator and
+    discarded. Block boundaries do not depend on sizes, so the
+    moments at n are the same whatever other sizes are requested.
+    The whole blocks are spread over workers processes and their
+    accumulators merged in block order as they arrive, so results
+    do not depend on the worker count either, and only the running
+    accumulator, the current partial block and a few blocks in
+    flight are held at any time.
+
+    Returns:
+        list of MomentAccumulator, one per n in sizes
+    """
+    shape = () if reps is None else (reps,)
+    cell = cell_key("stream-moments", generator_name(generator_fn))
+    step = max(1, max_elements // (reps or 1))
+
+    blocks = iter_tasks(
+        block_moments,
+        (
+            (generator_fn, cell, k, step, seed, reps)
+            for k in range(max(sizes) // step)
+        ),
+        workers,
+    )
+
+    done = MomentAccumulator(shape)
+    merged = 0
+    tail = None   # (k, block) of the last partial block drawn
+    results = []
+
+    for n in sizes:
+        k, rest = divmod(n, step)
+        for _ in range(merged, k):
+            done.merge(next(blocks))
+        merged = k
+
+        result = MomentAccumulator(shape).merge(done)
+        if rest:
+            if tail is None or tail[0] != k:
+                tail = (k, _draw_block(generator_fn, cell, k, step, seed,
+                                       reps))
+            result.merge(MomentAccumulator.from_samples(tail[1][..., :rest]))
+        results.append(result)
+
+    return results
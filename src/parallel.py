@@ -0,0 +1,111 @@
+import collections
+import functools
+from concurrent.futures import ProcessPoolExecutor
+
+import profiling
+
+
+def call(fn, *args):
+    """Module-level trampoline so tasks with different functions share a pool."""
+    return fn(*args)
+
+
+def run_tasks(fn, tasks, workers=None):
+    """
+    Call fn(*args) for every argument tuple in tasks.
+
+    With workers > 1 the calls are spread over a process pool.
+    Results always come back in task order, so anything merged
+    from them is identical whatever the worker count. While
+    profiling is enabled, the workers' stage events are added
+    to this process's trace.
+
+    Returns:
+        list of results, one per task
+    """
+    if not workers or workers <= 1 or len(tasks) <= 1:
+        return [fn(*args) for args in tasks]
+
+    traced = profiling.is_enabled()
+    if traced:
+        fn = functools.partial(profiling.run_traced, fn)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(fn, *zip(*tasks)))
+
+    if traced:
+        for _, worker_events in results:
+            profiling.merge_events(worker_events)
+        results = [result for result, _ in results]
+
+    return results
+
+
+def iter_tasks(fn, tasks, workers=None):
+    """
+    Lazy run_tasks: yield fn(*args) for every argument tuple in
+    tasks (any iterable), in task order. With workers > 1 at most
+    2 * workers tasks are in flight at a time, so a caller that
+    folds each result as it arrives holds only a few of them.
+    """
+    if not workers or workers <= 1:
+        for args in tasks:
+            yield fn(*args)
+        return
+
+    traced = profiling.is_enabled()
+    if traced:
+        fn = functools.partial(profiling.run_traced, fn)
+
+    def collect(future):
+        result = future.result()
+        if traced:
+            result, worker_events = result
+            profiling.merge_events(worker_events)
+        return result
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = collections.deque()
+
+        for args in tasks:
+            pending.append(pool.submit(fn, *args))
+            if len(pending) >= 2 * workers:
+                yield collect(pending.popleft())
+
+        while pending:
+            yield collect(pending.popleft())
+
+
+def run_grouped(fn, groups, workers=None):
+    """
+    run_tasks over several groups of tasks (e.g. the replicate
+    chunks of each grid cell) sharing one pool.
+
+    Returns:
+        list of result lists, one per group
+    """
+    flat = run_tasks(fn, [args for group in groups for args in group], workers)
+
+    results, i = [], 0
+    for group in groups:
+        results.append(flat[i:i + len(group)])
+        i += len(group)
+
+    return results
+
+
+def render(plot_fn, *data):
+    """call() for one figure, recorded as a "render" stage."""
+    with profiling.stage("render", figure=plot_fn.__name__):
+        return plot_fn(*data)
+
+
+def render_figures(jobs, workers=None):
+    """
+    Render independent figures from precomputed data. Each job is
+    (plot_fn, *data) and plot_fn saves to its own fixed path.
+
+    matplotlib is not thread-safe, so with workers > 1 the figures
+    are drawn in separate processes rather than threads.
+    """
+    run_tasks(render, jobs, workers)
@@ -0,0 +1,51 @@
+from parallel import call, run_tasks
+
+
+def run_graph(nodes, targets=None, workers=None):
+    """
+    Evaluate a small dependency graph, computing each node once.
+
+    nodes maps a name to (fn, deps): fn is called with the results
+    of the nodes named in deps, in that order. Nodes run in waves;
+    every node whose dependencies are finished joins the current
+    wave, and with workers > 1 a wave runs in a process pool, so
+    independent nodes are computed in parallel.
+
+    Args:
+        nodes: dict of name -> (fn, list of dependency names)
+        targets: names to compute (with their dependencies);
+            all nodes if None
+
+    Returns:
+        dict of name -> result for every node that was computed
+    """
+    needed, stack = set(), list(nodes if targets is None else targets)
+    while stack:
+        name = stack.pop()
+        if name not in needed:
+            needed.add(name)
+            stack.extend(nodes[name][1])
+
+    results = {}
+
+    while len(results) < len(needed):
+        wave = [
+            name for name in nodes
+            if name in needed and name not in results
+            and all(dep in results for dep in nodes[name][1])
+        ]
+        if not wave:
+            raise ValueError("dependency cycle among: "
+                             + ", ".join(sorted(needed - set(results))))
+
+        outputs = run_tasks(
+            call,
+            [
+                (nodes[name][0], *(results[dep] for dep in nodes[name][1]))
+                for name in wave
+            ],
+            workers,
+        )
+        results.update(zip(wave, outputs))
+
+    return results
@@ -0,0 +1,189 @@
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+
+
+_NULL_STAGE = contextlib.nullcontext()
+
+_state = {
+    "enabled": False,
+    "events": [],
+    "profile_stage": None,   # stage name to run under cProfile
+    "profiler": None,
+    "profile_depth": 0,
+}
+
+
+def enable(profile_stage=None):
+    """
+    Start recording stages (see stage). If profile_stage is given,
+    every stage of that name also runs under one shared cProfile
+    profiler, which write_profile saves.
+    """
+    _state["enabled"] = True
+    _state["profile_stage"] = profile_stage
+
+    if profile_stage is not None and _state["profiler"] is None:
+        _state["profiler"] = cProfile.Profile()
+
+
+def disable():
+    """Stop recording; recorded events are kept until reset()."""
+    _state["enabled"] = False
+
+
+def is_enabled():
+    return _state["enabled"]
+
+
+def reset():
+    """
+    Drop recorded events and profiler data. A stage set up for
+    profiling by enable() keeps being profiled, by a fresh profiler.
+    """
+    _state["events"] = []
+    _state["profiler"] = None
+    _state["profile_depth"] = 0
+
+    if _state["profile_stage"] is not None:
+        _state["profiler"] = cProfile.Profile()
+
+
+def events():
+    """Recorded events, as Chrome trace 'complete' (ph='X') dicts."""
+    return list(_state["events"])
+
+
+@contextlib.contextmanager
+def _recorded_stage(name, args):
+    profile = name == _state["profile_stage"]
+    profiler = _state["profiler"]
+
+    if profile:
+        if _state["profile_depth"] == 0:
+            profiler.enable()
+        _state["profile_depth"] += 1
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+
+        if profile:
+            _state["profile_depth"] -= 1
+            if _state["profile_depth"] == 0:
+                profiler.disable()
+
+        _state["events"].append({
+            "name": name,
+            "ph": "X",
+            "ts": start * 1e6,          # microseconds
+            "dur": (end - start) * 1e6,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        })
+
+
+def stage(name, **args):
+    """
+    Context manager timing one stage of the work, e.g.
+
+        with stage("generate", n=n):
+            block, _, _ = generator_fn(n, seed=seed, reps=reps)
+
+    Keyword arguments are stored with the event. When recording is
+    off this returns a shared no-op context, so instrumented code
+    costs one function call per stage.
+    """
+    if not _state["enabled"]:
+        return _NULL_STAGE
+    return _recorded_stage(name, args)
+
+
+def staged(name):
+    """
+    Decorator running every call of a function as one stage,
+    e.g. @staged("coverage_experiment") on a grid runner.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def run_traced(fn, *args):
+    """
+    Call fn(*args) with recording on and return its result together
+    with the events it produced. parallel.run_tasks uses this in pool
+    workers so their stages reach the parent's trace.
+
+    Returns:
+        (result, events)
+    """
+    # A forked worker starts with a copy of the parent's events;
+    # cProfile data is not collected from workers
+    _state["events"] = []
+    _state["enabled"] = True
+    _state["profile_stage"] = None
+
+    result = fn(*args)
+    return result, _state["events"]
+
+
+def merge_events(new_events):
+    """Add events recorded in another process (see run_traced)."""
+    _state["events"].extend(new_events)
+
+
+def summary():
+    """
+    Total time per stage name. Stages nest, so the totals of
+    enclosing and enclosed stages overlap.
+
+    Returns:
+        dict of name -> (calls, total_seconds), slowest first
+    """
+    totals = {}
+
+    for event in _state["events"]:
+        calls, seconds = totals.get(event["name"], (0, 0.0))
+        totals[event["name"]] = (calls + 1, seconds + event["dur"] / 1e6)
+
+    return dict(sorted(totals.items(), key=lambda kv: -kv[1][1]))
+
+
+def print_summary():
+    """Print summary() as a table."""
+    print(f"{'stage':<32}{'calls':>8}{'seconds':>12}")
+    for name, (calls, seconds) in summary().items():
+        print(f"{name:<32}{calls:>8}{seconds:>12.4f}")
+
+
+def write_trace(path):
+    """
+    Save the recorded events in Chrome trace format (JSON), viewable
+    in chrome://tracing or https://ui.perfetto.dev.
+    """
+    with open(path, "w") as f:
+        json.dump({"traceEvents": _state["events"],
+                   "displayTimeUnit": "ms"}, f, default=str)
+
+
+def write_profile(path):
+    """
+    Save the cProfile data of the profiled stage (see enable) for
+    pstats or snakeviz. Only stages run in this process are profiled.
+    """
+    if _state["profiler"] is None:
+        raise ValueError("no stage is being profiled; "
+                         "call enable(profile_stage=...) first")
+    _state["profiler"].dump_stats(path)
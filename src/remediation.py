@@ -1,92 +1,299 @@
+import functools
+import time
+
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-from scipy import stats
-from sklearn.mixture import GaussianMixture
 
 from distributions import (
     generate_lognormal,
     generate_student_t,
     generate_mixture,
+    replicate_chunks,
+    MAX_BLOCK_ELEMENTS,
 )
-from confidence_intervals import standard_95_ci
+from confidence_intervals import standard_95_ci, batched_95_ci, ci_from_moments
+from streams import cell_key, chunk_seed
+from gmm import fit_gmm_1d
+from parallel import run_tasks, render
+from pipeline import run_graph
+from profiling import stage
 
 SAMPLE_SIZES = [50, 200, 500, 1000, 5000]
 N_REPLICATES = 800   # lower than before to keep runtime reasonable
+BOOTSTRAP_RESAMPLES = 600
+MIXTURE_COMPONENT_MEANS = np.array([-2.0, 2.0])   # see generate_mixture
 
 
 # ============================================================
 # HELPER FUNCTIONS
 # ============================================================
 
-def lognormal_coverage_curves():
-    """Return (n, original_coverage, logspace_coverage)."""
+def lognormal_interval_block(block, true_mean):
+    """
+    Classical and log-space 95% CIs for every row of a (reps, n)
+    lognormal block, evaluated together.
 
-    orig = []
-    fixed = []
+    The classical interval is computed first; the block is then
+    log-transformed in place (it is overwritten) and the log-space
+    interval is computed and mapped back with exp.
 
-    for n in SAMPLE_SIZES:
-        covers_orig = []
-        covers_fixed = []
+    Returns:
+        orig_covers, orig_widths, log_covers, log_widths:
+        arrays of shape (reps,)
+    """
+    lo, hi = batched_95_ci(block)
 
-        for i in range(N_REPLICATES):
-            x, true_mean, _ = generate_lognormal(n, seed=i)
+    np.log(block, out=block)
+    lo_log, hi_log = batched_95_ci(block)
+    lo2, hi2 = np.exp(lo_log), np.exp(hi_log)
 
-            # ---- Original CI ----
-            lo, hi = standard_95_ci(x)
-            covers_orig.append(lo <= true_mean <= hi)
+    return (
+        (lo <= true_mean) & (true_mean <= hi),
+        hi - lo,
+        (lo2 <= true_mean) & (true_mean <= hi2),
+        hi2 - lo2,
+    )
 
-            # ---- Log-space CI ----
-            logx = np.log(x)
-            mu = np.mean(logx)
-            s = np.std(logx, ddof=1)
-            z = 1.96
-            m = z * s / np.sqrt(n)
 
-            lo_log, hi_log = mu - m, mu + m
-            lo2, hi2 = np.exp(lo_log), np.exp(hi_log)
+def lognormal_coverage_curves(return_widths=False):
+    """
+    Return (n, original_coverage, logspace_coverage).
 
-            covers_fixed.append(lo2 <= true_mean <= hi2)
+    return_widths=True appends the average width of each interval:
+    (n, original_coverage, logspace_coverage,
+     original_width, logspace_width).
+    """
+
+    orig, fixed = [], []
+    orig_width, fixed_width = [], []
+
+    for n in SAMPLE_SIZES:
+        results = [[], [], [], []]
+        cell = cell_key("remediation-lognormal", n)
+
+        for start, stop in replicate_chunks(N_REPLICATES, n):
+            with stage("generate", n=n, reps=stop - start):
+                x, true_mean, _ = generate_lognormal(
+                    n, seed=chunk_seed(cell, start), reps=stop - start
+                )
+            with stage("statistic", n=n, reps=stop - start):
+                block_results = lognormal_interval_block(x, true_mean)
+                for acc, values in zip(results, block_results):
+                    acc.extend(values)
+
+        covers_orig, widths_orig, covers_fixed, widths_fixed = results
 
         orig.append(np.mean(covers_orig))
         fixed.append(np.mean(covers_fixed))
+        orig_width.append(np.mean(widths_orig))
+        fixed_width.append(np.mean(widths_fixed))
+
+    curves = (np.array(SAMPLE_SIZES), np.array(orig), np.array(fixed))
+
+    if return_widths:
+        return curves + (np.array(orig_width), np.array(fixed_width))
+    return curves
+
+
+def median_along_last_axis(a):
+    """
+    Median over the last axis using np.partition (no full sort).
+    """
+    n = a.shape[-1]
+    half = n // 2
+
+    if n % 2:
+        return np.partition(a, half, axis=-1)[..., half]
+
+    part = np.partition(a, [half - 1, half], axis=-1)
+    return 0.5 * (part[..., half - 1] + part[..., half])
+
+
+def bootstrap_median_ci(block, B=BOOTSTRAP_RESAMPLES, seed=None):
+    """
+    Percentile-bootstrap 95% CI for the median of every row of a
+    (reps, n) block.
+
+    For a group of rows at once, one (rows, B, n) index matrix is
+    drawn, the resamples are gathered with take_along_axis and
+    their medians taken along the last axis. Groups are sized so
+    each holds about MAX_BLOCK_ELEMENTS values.
+
+    Returns: (lower_bounds, upper_bounds), arrays of shape (reps,)
+    """
+    rng = np.random.default_rng(seed)
+    reps, n = block.shape
+
+    lower = np.empty(reps)
+    upper = np.empty(reps)
+    rows = max(1, MAX_BLOCK_ELEMENTS // (B * n))
+
+    for start in range(0, reps, rows):
+        sub = block[start:start + rows, None, :]
+        idx = rng.integers(0, n, size=(sub.shape[0], B, n))
+
+        meds = median_along_last_axis(np.take_along_axis(sub, idx, axis=-1))
+        lower[start:start + rows] = np.percentile(meds, 2.5, axis=1)
+        upper[start:start + rows] = np.percentile(meds, 97.5, axis=1)
+
+    return lower, upper
+
+
+def exact_median_ci(block, alpha=0.05):
+    """
+    Distribution-free CI for the median of every row of a (reps, n)
+    block, from binomial order statistics.
+
+    With k the alpha/2 quantile of Binomial(n, 1/2), the interval
+    [x_(k), x_(n-k+1)] covers the median with probability at least
+    1 - alpha for any continuous distribution. Only two order
+    statistics are needed, so np.partition replaces resampling.
 
-    return np.array(SAMPLE_SIZES), np.array(orig), np.array(fixed)
+    When 2**-n >= alpha/2 (n <= 5 for alpha = 0.05) no such k >= 1
+    exists; k is then clamped to 1 and the interval is the sample
+    range [min, max], whose coverage is only 1 - 2**(1 - n)
+    (0.94 at n = 5).
+
+    Returns: (lower_bounds, upper_bounds), arrays of shape (reps,)
+    """
+    from scipy import stats
 
+    n = block.shape[1]
+    k = max(int(stats.binom.ppf(alpha / 2, n, 0.5)), 1)
 
-def studentt_robust_curves():
-    """Return (n, mean_cov, median_cov, trimmed_cov)."""
+    part = np.partition(block, [k - 1, n - k], axis=1)
+    return part[:, k - 1], part[:, n - k]
 
-    def bootstrap_median_ci(samples, B=600):
-        n = len(samples)
-        meds = [
-            np.median(np.random.choice(samples, size=n, replace=True))
-            for _ in range(B)
-        ]
-        return np.percentile(meds, 2.5), np.percentile(meds, 97.5)
 
-    def trimmed_ci(samples, trim=0.1):
-        tmean = stats.trim_mean(samples, proportiontocut=trim)
-        se = stats.sem(samples)
-        z = 1.96
-        return tmean - z * se, tmean + z * se
+MEDIAN_CI_METHODS = {
+    "exact": lambda block, seed: exact_median_ci(block),
+    "bootstrap": lambda block, seed: bootstrap_median_ci(block, seed=seed),
+}
+
+
+def compare_median_ci_methods(sizes=None, reps=None):
+    """
+    Run the exact and bootstrap median CIs on the same Student-t
+    samples and compare them. sizes and reps default to
+    SAMPLE_SIZES and N_REPLICATES. Each method is run once on a
+    small block before timing, so one-off costs such as imports
+    are not charged to the first n.
+
+    Returns:
+        pandas DataFrame with columns:
+        ['n', 'exact_coverage', 'bootstrap_coverage', 'agreement',
+         'exact_seconds', 'bootstrap_seconds']
+        where agreement is the fraction of replicates on which both
+        intervals make the same covers / misses call.
+    """
+    import pandas as pd
+
+    sizes = SAMPLE_SIZES if sizes is None else sizes
+    reps = N_REPLICATES if reps is None else reps
+
+    warmup = np.zeros((1, 10))
+    for ci_fn in MEDIAN_CI_METHODS.values():
+        ci_fn(warmup, 0)
+
+    records = []
+
+    for n in sizes:
+        covers = {name: [] for name in MEDIAN_CI_METHODS}
+        seconds = dict.fromkeys(MEDIAN_CI_METHODS, 0.0)
+        cell = cell_key("remediation-student-t", n)
+
+        for start, stop in replicate_chunks(reps, n):
+            data_seed, boot_seed = chunk_seed(cell, start).spawn(2)
+            x, true_mean, _ = generate_student_t(
+                n, seed=data_seed, reps=stop - start
+            )
+
+            for name, ci_fn in MEDIAN_CI_METHODS.items():
+                t0 = time.perf_counter()
+                lo, hi = ci_fn(x, boot_seed)
+                seconds[name] += time.perf_counter() - t0
+                covers[name].extend((lo <= true_mean) & (true_mean <= hi))
+
+        exact = np.array(covers["exact"])
+        boot = np.array(covers["bootstrap"])
+
+        records.append({
+            "n": n,
+            "exact_coverage": exact.mean(),
+            "bootstrap_coverage": boot.mean(),
+            "agreement": np.mean(exact == boot),
+            "exact_seconds": seconds["exact"],
+            "bootstrap_seconds": seconds["bootstrap"],
+        })
+
+    return pd.DataFrame.from_records(records)
+
+
+def trimmed_mean_ci(block, trim=0.1, width="sem"):
+    """
+    95% CI around the trimmed mean of every row of a (reps, n) block.
+
+    One np.partition per block isolates the central band that
+    stats.trim_mean averages. width picks the standard error:
+        "sem": SEM of the full sample (the original interval)
+        "winsorized": winsorized SD / ((1 - 2 * trim) * sqrt(n)),
+            the Tukey-McLaughlin trimmed-mean standard error
+
+    Returns: (lower_bounds, upper_bounds), arrays of shape (reps,)
+    """
+    n = block.shape[1]
+    g = int(trim * n)
+
+    part = np.partition(block, [g, n - g - 1], axis=1)
+    tmean = np.mean(part[:, g:n - g], axis=1)
+
+    if width == "sem":
+        se = np.std(block, axis=1, ddof=1) / np.sqrt(n)
+    elif width == "winsorized":
+        winsorized = np.clip(part, part[:, g:g + 1], part[:, n - g - 1:n - g])
+        se = np.std(winsorized, axis=1, ddof=1) / ((1 - 2 * trim) * np.sqrt(n))
+    else:
+        raise ValueError(f"unknown trimmed-mean width: {width!r}")
+
+    z = 1.96
+    return tmean - z * se, tmean + z * se
+
+
+def studentt_robust_curves(median_method="exact", trimmed_width="sem"):
+    """
+    Return (n, mean_cov, median_cov, trimmed_cov).
+
+    median_method picks the median CI: "exact" (binomial order
+    statistics, the fast default) or "bootstrap" (the reference).
+    trimmed_width picks the trimmed-mean standard error
+    (see trimmed_mean_ci).
+    """
+    median_ci = MEDIAN_CI_METHODS[median_method]
 
     mean_cov, med_cov, trim_cov = [], [], []
 
     for n in SAMPLE_SIZES:
         m, md, t = [], [], []
+        cell = cell_key("remediation-student-t", n)
 
-        for i in range(N_REPLICATES):
-            x, true_mean, _ = generate_student_t(n, seed=i)
+        for start, stop in replicate_chunks(N_REPLICATES, n):
+            # One stream for the data, one for the bootstrap resamples
+            data_seed, boot_seed = chunk_seed(cell, start).spawn(2)
+            with stage("generate", n=n, reps=stop - start):
+                x, true_mean, _ = generate_student_t(
+                    n, seed=data_seed, reps=stop - start
+                )
 
-            lo, hi = standard_95_ci(x)
-            m.append(lo <= true_mean <= hi)
+            with stage("statistic", n=n, reps=stop - start, ci="mean"):
+                lo, hi = batched_95_ci(x)
+                m.extend((lo <= true_mean) & (true_mean <= hi))
 
-            lo2, hi2 = bootstrap_median_ci(x)
-            md.append(lo2 <= true_mean <= hi2)
+            with stage("statistic", n=n, reps=stop - start, ci="median"):
+                lo2, hi2 = median_ci(x, boot_seed)
+                md.extend((lo2 <= true_mean) & (true_mean <= hi2))
 
-            lo3, hi3 = trimmed_ci(x)
-            t.append(lo3 <= true_mean <= hi3)
+            with stage("statistic", n=n, reps=stop - start, ci="trimmed"):
+                lo3, hi3 = trimmed_mean_ci(x, width=trimmed_width)
+                t.extend((lo3 <= true_mean) & (true_mean <= hi3))
 
         mean_cov.append(np.mean(m))
         med_cov.append(np.mean(md))
@@ -108,8 +315,7 @@ def mixture_before_after_points(n=1200, seed=0):
     single_mean = np.mean(x)
     single_lo, single_hi = standard_95_ci(x)
 
-    gmm = GaussianMixture(n_components=2, random_state=seed)
-    labels = gmm.fit_predict(x.reshape(-1, 1))
+    labels = fit_gmm_1d(x, k=2, seed=seed)["labels"]
 
     means, cis = [], []
 
@@ -123,17 +329,107 @@ def mixture_before_after_points(n=1200, seed=0):
     return single_mean, (single_lo, single_hi), means, cis
 
 
+def gmm_coverage_chunk(n, reps, seed):
+    """
+    Cluster-then-CI for one (reps, n) mixture block: fit a 2-component
+    GMM to every replicate in one batched call, split each sample by
+    cluster label and build the classical 95% CI for each cluster mean.
+
+    Returns:
+        hits: number of covering intervals per component, shape (2,)
+    """
+    data_seed, fit_seed = seed.spawn(2)
+
+    with stage("generate", n=n, reps=reps):
+        x, _, _ = generate_mixture(n, seed=data_seed, reps=reps)
+
+    with stage("statistic", n=n, reps=reps, step="gmm_fit"):
+        labels = fit_gmm_1d(x, k=2, seed=fit_seed)["labels"]
+
+    with stage("statistic", n=n, reps=reps, step="cluster_ci"):
+        onehot = labels[:, :, None] == np.arange(2)
+        counts = np.sum(onehot, axis=1)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.einsum("rnk,rn->rk", onehot, x) / counts
+            sq = (x[:, :, None] - means[:, None, :]) ** 2
+            variances = np.einsum("rnk,rnk->rk", onehot, sq) / (counts - 1)
+            lo, hi = ci_from_moments(means, variances, counts)
+
+    # clusters with fewer than two points give NaN bounds and never cover
+    covers = (lo <= MIXTURE_COMPONENT_MEANS) & (MIXTURE_COMPONENT_MEANS <= hi)
+    return np.sum(covers, axis=0)
+
+
+def mixture_gmm_coverage_curves(workers=None):
+    """
+    Replicated coverage of the GMM remediation: for every n and
+    replicate, cluster the mixture sample and check whether each
+    cluster's 95% CI contains its true component mean (-2 and 2).
+
+    workers > 1 fits the replicate chunks in a process pool.
+
+    Returns (n, low_component_cov, high_component_cov).
+    """
+    tasks, owners = [], []
+
+    for i, n in enumerate(SAMPLE_SIZES):
+        cell = cell_key("remediation-mixture-gmm", n)
+        for start, stop in replicate_chunks(N_REPLICATES, n):
+            tasks.append((n, stop - start, chunk_seed(cell, start)))
+            owners.append(i)
+
+    hits = np.zeros((len(SAMPLE_SIZES), 2))
+    for i, h in zip(owners, run_tasks(gmm_coverage_chunk, tasks, workers)):
+        hits[i] += h
+
+    coverage = hits / N_REPLICATES
+    return np.array(SAMPLE_SIZES), coverage[:, 0], coverage[:, 1]
+
+
 # ============================================================
 # SINGLE HIGH-GRADE FIGURE
 # ============================================================
 
-def plot_three_panel_remediation():
+def remediation_data(workers=None):
+    """
+    Compute the data behind all three panels; the four computations
+    are independent and run in parallel when workers > 1, and the
+    GMM replicate chunks are spread over workers processes as well.
+
+    Returns:
+        dict with keys 'lognormal', 'student_t', 'mixture_points'
+        and 'mixture_coverage'
+    """
+    return run_graph({
+        "lognormal": (lognormal_coverage_curves, []),
+        "student_t": (studentt_robust_curves, []),
+        "mixture_points": (mixture_before_after_points, []),
+        "mixture_coverage": (
+            functools.partial(mixture_gmm_coverage_curves, workers=workers),
+            [],
+        ),
+    }, workers=workers)
+
+
+def plot_three_panel_remediation(data=None):
+    """
+    Draw the three remediation panels from remediation_data()
+    (computed here if not given).
+
+    Saves: outputs/remediation_three_panel.png
+    """
+    import matplotlib.pyplot as plt
+
+    if data is None:
+        data = remediation_data()
+
     fig, axes = plt.subplots(1, 3, figsize=(15, 5))
 
     # -------------------------------------------------------
     # PANEL A — LOGNORMAL FIX
     # -------------------------------------------------------
-    n, orig, fixed = lognormal_coverage_curves()
+    n, orig, fixed = data["lognormal"]
 
     ax = axes[0]
     ax.plot(n, orig, marker="o", label="Classical CI (bad)")
@@ -152,7 +448,7 @@ def plot_three_panel_remediation():
     # -------------------------------------------------------
     # PANEL B — STUDENT-t ROBUST FIX
     # -------------------------------------------------------
-    n, mean_cov, med_cov, trim_cov = studentt_robust_curves()
+    n, mean_cov, med_cov, trim_cov = data["student_t"]
 
     ax = axes[1]
     ax.plot(n, mean_cov, marker="o", label="Mean CI (fragile)")
@@ -172,7 +468,7 @@ def plot_three_panel_remediation():
     # -------------------------------------------------------
     # PANEL C — MIXTURE + GMM
     # -------------------------------------------------------
-    single_mean, (s_lo, s_hi), means, cis = mixture_before_after_points()
+    single_mean, (s_lo, s_hi), means, cis = data["mixture_points"]
 
     ax = axes[2]
 
@@ -190,6 +486,17 @@ def plot_three_panel_remediation():
         ax.axvline(mu, color=colors[i], label=f"Cluster {i+1} mean")
         ax.plot([lo, hi], [0.015 + 0.002 * i, 0.015 + 0.002 * i], color=colors[i])
 
+    # replicated coverage of the cluster CIs
+    n, low_cov, high_cov = data["mixture_coverage"]
+    lines = [
+        f"n={m}: {lo:.2f} / {hi:.2f}"
+        for m, lo, hi in zip(n, low_cov, high_cov)
+    ]
+    ax.text(
+        0.02, 0.98, "Cluster CI coverage\n" + "\n".join(lines),
+        transform=ax.transAxes, va="top", fontsize=8,
+    )
+
     ax.set_title(
         "C) Mixture → GMM reveals two real populations"
     )
@@ -201,9 +508,10 @@ def plot_three_panel_remediation():
     plt.close()
 
 
-def main():
+def main(workers=None):
     print("Generating single three-panel remediation figure...")
-    plot_three_panel_remediation()
+    data = remediation_data(workers=workers)
+    render(plot_three_panel_remediation, data)
     print("Saved: outputs/remediation_three_panel.png")
 
 
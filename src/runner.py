@@ -0,0 +1,254 @@
+import json
+import os
+
+from cache import CACHE_DIR, cached_experiment
+from confidence_intervals import coverage_from_moments, run_coverage_experiment
+from convergence import run_convergence_experiment
+from distributions import DISTRIBUTIONS, make_distribution
+from estimation import run_estimation_experiment, sampling_distribution
+from hypothesis_testing import run_testing_experiment, type_i_error_from_moments
+from parallel import run_tasks
+
+
+EXPERIMENTS = ["estimation", "convergence", "coverage", "testing"]
+
+# How replicates are drawn for the coverage and testing grids:
+#   loop       - one generator call per replicate (the original design)
+#   vectorized - batched (reps, n) chunks
+#   nested     - one draw per replicate at max(sizes), prefixes reused
+#                (also used by the convergence experiment)
+#   shared     - coverage and t-test read the same replicate moments
+#                from estimation.sampling_distribution
+METHODS = ["loop", "vectorized", "nested", "shared"]
+
+# Every key a config file may set, with its default
+DEFAULT_CONFIG = {
+    "experiments": EXPERIMENTS,
+    "distributions": [name for name, _, _ in DISTRIBUTIONS],
+    "sizes": [50, 200, 500, 1000, 5000],
+    "replicates": 1000,
+    "alpha": 0.05,
+    "method": "vectorized",
+    "tol": None,   # adaptive grids; overrides method and replicates
+    "workers": None,
+    "cache_dir": CACHE_DIR,   # None or "" disables the cache
+    "checkpoint_dir": None,   # resumable coverage/testing grids
+    "output_dir": None,
+}
+
+
+def load_config(path=None, **overrides):
+    """
+    Read an experiment spec from a JSON file, fill in defaults from
+    DEFAULT_CONFIG and apply overrides (None values are ignored,
+    so unset command-line flags leave the file's values alone).
+
+    Example file:
+
+        {
+            "experiments": ["coverage", "testing"],
+            "distributions": ["normal", {"name": "student_t", "df": 3}],
+            "sizes": [50, 500, 5000],
+            "replicates": 20000,
+            "method": "shared",
+            "workers": 8
+        }
+
+    Returns:
+        dict with every key of DEFAULT_CONFIG
+    """
+    config = dict(DEFAULT_CONFIG)
+
+    if path is not None:
+        with open(path) as f:
+            config.update(json.load(f))
+
+    config.update({k: v for k, v in overrides.items() if v is not None})
+
+    unknown = set(config) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError("unknown config keys: " + ", ".join(sorted(unknown)))
+
+    bad = set(config["experiments"]) - set(EXPERIMENTS)
+    if bad:
+        raise ValueError(f"unknown experiments: {', '.join(sorted(bad))}; "
+                         f"choose from {', '.join(EXPERIMENTS)}")
+
+    if config["method"] not in METHODS:
+        raise ValueError(f"unknown method {config['method']!r}; "
+                         f"choose from {', '.join(METHODS)}")
+
+    if config["method"] == "shared" and config["tol"] is not None:
+        raise ValueError("tol (adaptive replicates) cannot be combined "
+                         "with method 'shared'")
+
+    # The nested design needs distinct ascending sizes
+    config["sizes"] = sorted(set(int(n) for n in config["sizes"]))
+    if not config["sizes"] or config["sizes"][0] < 2:
+        raise ValueError("sizes must be a non-empty list of sample "
+                         "sizes of at least 2")
+
+    if not config["cache_dir"]:
+        config["cache_dir"] = None
+
+    return config
+
+
+def resolve_distributions(specs):
+    """
+    Turn config entries into DISTRIBUTIONS-style tuples. Each entry
+    is a generator name ("lognormal") or a dict with a name and
+    generator parameters ({"name": "lognormal", "sigma": 0.5}).
+
+    Returns:
+        list of (label, generator_fn, true_mean)
+    """
+    resolved = []
+
+    for spec in specs:
+        if isinstance(spec, str):
+            resolved.append(make_distribution(spec))
+        else:
+            params = dict(spec)
+            resolved.append(make_distribution(params.pop("name"), **params))
+
+    return resolved
+
+
+# ============================================================
+# SHARED GENERATION (coverage and t-test from one draw)
+# ============================================================
+
+def shared_cell(generator_fn, true_mean, n, reps, alpha):
+    """
+    CI coverage and t-test Type I error of one grid cell, both
+    computed from one estimation.sampling_distribution, so the
+    replicates are drawn once for the two experiments and freed
+    when the cell is done.
+
+    Returns:
+        (coverage_rate, avg_width, type_i_rate)
+    """
+    means, variances = sampling_distribution(generator_fn, n, reps)
+
+    coverage, width = coverage_from_moments(means, variances, n, true_mean)
+    type_i = type_i_error_from_moments(means, variances, n, true_mean,
+                                       alpha=alpha)
+    return coverage, width, type_i
+
+
+def run_shared_experiment(sizes, reps, distributions, alpha, workers=None):
+    """
+    Coverage and testing grids computed together, one shared_cell
+    per (distribution, n); workers > 1 spreads the cells over a
+    process pool.
+
+    Returns:
+        DataFrame with columns:
+        ['distribution', 'n', 'coverage', 'avg_ci_width', 'type_i_error']
+    """
+    import pandas as pd
+
+    cells = [(name, n) for n in sizes for name, _, _ in distributions]
+    results = run_tasks(
+        shared_cell,
+        [
+            (gen, true_mean, n, reps, alpha)
+            for n in sizes
+            for _, gen, true_mean in distributions
+        ],
+        workers,
+    )
+
+    records = [
+        {
+            "distribution": name,
+            "n": n,
+            "coverage": coverage,
+            "avg_ci_width": width,
+            "type_i_error": type_i,
+        }
+        for (name, n), (coverage, width, type_i) in zip(cells, results)
+    ]
+    return pd.DataFrame.from_records(records)
+
+
+# ============================================================
+# RUNNER
+# ============================================================
+
+def run_config(config):
+    """
+    Run the experiments named in config (see load_config), each
+    through the result cache in config["cache_dir"] unless it is
+    None, and with its grid cells spread over config["workers"].
+
+    Returns:
+        dict of experiment name -> results DataFrame
+    """
+    def run(run_fn, **kwargs):
+        if config["cache_dir"] is None:
+            return run_fn(**kwargs)
+        return cached_experiment(run_fn, cache_dir=config["cache_dir"],
+                                 **kwargs)
+
+    wanted = config["experiments"]
+    method = config["method"]
+    grid = {
+        "sizes": config["sizes"],
+        "distributions": resolve_distributions(config["distributions"]),
+    }
+    sampling = {
+        "vectorized": method == "vectorized",
+        "nested": method == "nested",
+        "tol": config["tol"],
+        "reps": config["replicates"],
+        "workers": config["workers"],
+        "checkpoint_dir": config["checkpoint_dir"],
+    }
+
+    results = {}
+
+    if method == "shared" and {"coverage", "testing"} & set(wanted):
+        df = run(run_shared_experiment, reps=config["replicates"],
+                 alpha=config["alpha"], workers=config["workers"], **grid)
+        results["coverage"] = df.drop(columns="type_i_error")
+        results["testing"] = df.drop(columns=["coverage", "avg_ci_width"])
+
+    for name in wanted:
+        if name in results:
+            continue
+
+        if name == "estimation":
+            results[name] = run(run_estimation_experiment,
+                                workers=config["workers"], **grid)
+        elif name == "convergence":
+            results[name] = run(run_convergence_experiment,
+                                nested=method == "nested", **grid)
+        elif name == "coverage":
+            results[name] = run(run_coverage_experiment, **sampling, **grid)
+        elif name == "testing":
+            results[name] = run(run_testing_experiment, alpha=config["alpha"],
+                                **sampling, **grid)
+
+    return {name: results[name] for name in wanted}
+
+
+def main(config):
+    """
+    Run config, print every results table and, if
+    config["output_dir"] is set, save each as <experiment>.csv there.
+    """
+    results = run_config(config)
+
+    if config["output_dir"] is not None:
+        os.makedirs(config["output_dir"], exist_ok=True)
+
+    for name, df in results.items():
+        print(f"\n==== {name} ====")
+        print(df.to_string(index=False))
+
+        if config["output_dir"] is not None:
+            path = os.path.join(config["output_dir"], f"{name}.csv")
+            df.to_csv(path, index=False)
+            print(f"Saved: {path}")
@@ -0,0 +1,74 @@
+import numpy as np
+
+from checkpoint import load_state, save_state
+from distributions import MAX_BLOCK_ELEMENTS
+from streams import chunk_seed
+
+
+BATCH_REPLICATES = 250      # replicates per sequential batch
+MIN_REPLICATES = 500        # never stop before this many
+MAX_REPLICATES = 100_000    # hard budget per cell
+
+
+def binomial_se(successes, trials):
+    """
+    Monte Carlo standard error of a proportion estimated from
+    trials replicates.
+
+    Uses the (successes + 1) / (trials + 2) estimate of p so a
+    cell with no misses (e.g. coverage 1.0) does not report an
+    error of exactly zero.
+    """
+    p = (successes + 1) / (trials + 2)
+    return float(np.sqrt(p * (1 - p) / trials))
+
+
+def run_until_precise(chunk_fn, n, cell, tol, seed_start=0,
+                      batch=BATCH_REPLICATES, max_reps=MAX_REPLICATES,
+                      checkpoint=None):
+    """
+    Run replicate batches for one grid cell until the binomial
+    standard error of the estimated rate drops below tol.
+
+    chunk_fn(reps, seed) must return the number of "successes"
+    (covering intervals, rejections, ...) in its batch, optionally
+    followed by further sums to accumulate, e.g. (hits, width_sum).
+    Batch k draws from chunk_seed(cell, k * batch), so the first
+    batches are the same whatever tol is.
+
+    If checkpoint (a file path) is given, the running totals are
+    saved there after every batch and a restarted call continues
+    from them; see checkpoint.save_state.
+
+    Returns:
+        totals: numpy array of the summed chunk_fn results
+        replicates: number of replicates used
+    """
+    batch = min(batch, max(1, MAX_BLOCK_ELEMENTS // n))
+    totals, done = 0.0, 0
+
+    state = load_state(checkpoint) if checkpoint else None
+    if state is not None:
+        totals, done = np.array(state["totals"]), state["done"]
+        if state["precise"]:
+            return totals, done
+
+    while done < max_reps:
+        reps = min(batch, max_reps - done)
+        result = chunk_fn(reps, chunk_seed(cell, done, seed=seed_start))
+
+        totals = totals + np.atleast_1d(result)
+        done += reps
+
+        precise = (done >= MIN_REPLICATES
+                   and binomial_se(totals[0], done) < tol)
+
+        if checkpoint:
+            save_state(checkpoint, {
+                "totals": totals.tolist(), "done": done, "precise": precise,
+            })
+
+        if precise:
+            break
+
+    return totals, done
@@ -0,0 +1,47 @@
+import functools
+import zlib
+
+import numpy as np
+
+
+def cell_key(*labels):
+    """
+    Stable non-negative integer naming one grid cell, e.g.
+    cell_key("coverage", "generate_normal", 200).
+
+    Unlike hash(), the key is identical in every process, so
+    workers agree on which stream belongs to which cell.
+    """
+    return zlib.crc32(repr(labels).encode())
+
+
+def chunk_seed(cell, start, seed=0):
+    """
+    SeedSequence for the replicate chunk that starts at replicate
+    `start` of grid cell `cell`.
+
+    This is the child SeedSequence(seed).spawn() would reach at
+    spawn key (cell, start), built directly instead of by spawning
+    every earlier child. Any worker can therefore jump straight to
+    replicate `start` of any cell, and streams of different cells,
+    chunks or root seeds are statistically independent.
+
+    Pass the result as the seed argument of any generator.
+    """
+    return np.random.SeedSequence(seed, spawn_key=(cell, start))
+
+
+def generator_name(generator_fn):
+    """
+    Name of a generator function. A functools.partial is named by the
+    wrapped function and its bound arguments, e.g.
+    "generate_lognormal(sigma=0.5)", so every parameter set of a
+    generator gets its own streams.
+    """
+    if not isinstance(generator_fn, functools.partial):
+        return generator_fn.__name__
+
+    args = [repr(a) for a in generator_fn.args] + [
+        f"{k}={v!r}" for k, v in sorted(generator_fn.keywords.items())
+    ]
+    return f"{generator_name(generator_fn.func)}({', '.join(args)})"
@@ -1,7 +1,6 @@
+import argparse
+
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-from scipy.stats import gaussian_kde
 
 from distributions import (
     generate_normal,
@@ -10,38 +9,84 @@ from distributions import (
     generate_mixture,
 )
 
-from estimation import run_estimation_experiment
-from confidence_intervals import run_coverage_experiment
-from convergence import run_convergence_experiment
-from hypothesis_testing import run_testing_experiment
+from estimation import sampling_distribution
+from cache import (
+    cached_experiment,
+    code_version,
+    input_hash,
+    figure_is_current,
+    record_figure,
+)
+from density import binned_kde
+from pipeline import run_graph
+from parallel import render_figures
+import profiling
 
 # Make figures clean and publication-style
-plt.rcParams.update({
+PLOT_STYLE = {
     "figure.dpi": 180,
     "font.size": 10,
     "axes.grid": True,
-})
+}
+
+
+def _pyplot():
+    """
+    Import pyplot on first use (it is slow to load) and apply
+    PLOT_STYLE, so importing this module stays cheap.
+    """
+    import matplotlib.pyplot as plt
+
+    plt.rcParams.update(PLOT_STYLE)
+    return plt
+
+
+# -------------------------------------------------------------
+# DATA — experiment modules are imported only when needed
+# -------------------------------------------------------------
+
+def coverage_grid():
+    """run_coverage_experiment(), through the result cache."""
+    from confidence_intervals import run_coverage_experiment
+
+    return cached_experiment(run_coverage_experiment)
+
+
+def convergence_table():
+    """run_convergence_experiment(), through the result cache."""
+    from convergence import run_convergence_experiment
+
+    return cached_experiment(run_convergence_experiment)
+
+
+def ttest_grid():
+    """run_testing_experiment(), through the result cache."""
+    from hypothesis_testing import run_testing_experiment
+
+    return cached_experiment(run_testing_experiment)
 
 
 # -------------------------------------------------------------
 # FIGURE 1 — Distribution panels (population vs sampling mean)
 # -------------------------------------------------------------
 
-def plot_distribution_panels():
+def distribution_panel_data(kde="fft", population_size=5000):
     """
-    For each distribution:
-    Left: population density with true vs sample mean marked
-    Right: sampling distribution of the mean
+    Data behind plot_distribution_panels: for each distribution, the
+    population density curve, true and sample means, and the sampling
+    distribution of the mean at n = 200 (5,000 replicates).
 
-    Saves: outputs/distribution_panels.png
-    """
+    kde picks the density estimator for the population panels:
+    "fft" (binned FFT KDE, cheap for millions of draws) or
+    "direct" (scipy.stats.gaussian_kde).
 
+    Returns:
+        dict of name -> (xs, density, true_mean, sample_mean, n, means)
+    """
     np.random.seed(0)
     n = 200
     reps = 5000
 
-    fig, axes = plt.subplots(4, 2, figsize=(10, 14))
-
     generators = {
         "Normal": generate_normal,
         "Lognormal": generate_lognormal,
@@ -49,19 +94,50 @@ def plot_distribution_panels():
         "Mixture": generate_mixture,
     }
 
-    for i, (name, gen) in enumerate(generators.items()):
+    data = {}
 
-        # ----- Left panel: population shape -----
-        x, true_mean, _ = gen(5000)
+    for name, gen in generators.items():
+        x, true_mean, _ = gen(population_size)
+
+        if kde == "fft":
+            xs, density = binned_kde(x, gridsize=400)
+        else:
+            from scipy.stats import gaussian_kde
+
+            xs = np.linspace(min(x), max(x), 400)
+            density = gaussian_kde(x)(xs)
+
+        means, _ = sampling_distribution(gen, n, reps)
+        sample_mean = float(np.mean(x[:n]))
+        data[name] = (xs, density, true_mean, sample_mean, n, means)
+
+    return data
+
+
+def plot_distribution_panels(data=None):
+    """
+    For each distribution:
+    Left: population density with true vs sample mean marked
+    Right: sampling distribution of the mean
 
-        kde = gaussian_kde(x)
-        xs = np.linspace(min(x), max(x), 400)
+    data: distribution_panel_data() (computed here if not given)
 
+    Saves: outputs/distribution_panels.png
+    """
+    plt = _pyplot()
+
+    if data is None:
+        data = distribution_panel_data()
+
+    fig, axes = plt.subplots(4, 2, figsize=(10, 14))
+
+    for i, (name, panel) in enumerate(data.items()):
+        xs, density, true_mean, sample_mean, n, means = panel
+
+        # ----- Left panel: population shape -----
         ax = axes[i, 0]
-        ax.plot(xs, kde(xs))
+        ax.plot(xs, density)
         ax.axvline(true_mean, linestyle="--", label="True mean")
-
-        sample_mean = np.mean(x[:n])
         ax.axvline(sample_mean, linestyle=":", label="Sample mean")
 
         ax.set_title(f"{name}: Population distribution")
@@ -71,11 +147,6 @@ def plot_distribution_panels():
             ax.legend()
 
         # ----- Right panel: sampling distribution of the mean -----
-        means = []
-        for r in range(reps):
-            s, _, _ = gen(n, seed=r)
-            means.append(np.mean(s))
-
         ax2 = axes[i, 1]
         ax2.hist(means, bins=60, density=True)
         ax2.set_title(f"{name}: Sampling distribution of the mean (n={n})")
@@ -91,16 +162,21 @@ def plot_distribution_panels():
 # FIGURE 2 — CI coverage + width (two-panel research plot)
 # -------------------------------------------------------------
 
-def plot_ci_coverage_with_width():
+def plot_ci_coverage_with_width(df=None):
     """
     Two-panel figure:
     Top: empirical coverage vs n
     Bottom: average CI width vs n
 
+    df: coverage grid from run_coverage_experiment (computed,
+    through the cache, if not given)
+
     Saves: outputs/ci_coverage_research.png
     """
+    plt = _pyplot()
 
-    df = run_coverage_experiment()
+    if df is None:
+        df = coverage_grid()
 
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(9, 9), sharex=True)
 
@@ -129,14 +205,19 @@ def plot_ci_coverage_with_width():
 # FIGURE 3 — Absolute error convergence (better than raw means)
 # -------------------------------------------------------------
 
-def plot_absolute_error_convergence():
+def plot_absolute_error_convergence(df=None):
     """
     Plots absolute error from true mean vs sample size.
 
+    df: convergence table from run_convergence_experiment
+    (computed, through the cache, if not given)
+
     Saves: outputs/mean_error_convergence.png
     """
+    plt = _pyplot()
 
-    df = run_convergence_experiment()
+    if df is None:
+        df = convergence_table()
 
     plt.figure(figsize=(8, 6))
 
@@ -165,17 +246,22 @@ def plot_absolute_error_convergence():
 # FIGURE 4 — t-test miscalibration (centered at zero)
 # -------------------------------------------------------------
 
-def plot_ttest_miscalibration():
+def plot_ttest_miscalibration(df=None):
     """
     Plots (empirical Type I error - 0.05).
 
     Zero = perfectly calibrated test.
 
+    df: t-test grid from run_testing_experiment (computed,
+    through the cache, if not given)
+
     Saves: outputs/ttest_miscalibration.png
     """
+    plt = _pyplot()
 
-    df = run_testing_experiment()
-    df["miscalibration"] = df["type_i_error"] - 0.05
+    if df is None:
+        df = ttest_grid()
+    df = df.assign(miscalibration=df["type_i_error"] - 0.05)
 
     plt.figure(figsize=(8, 6))
 
@@ -204,16 +290,29 @@ def plot_ttest_miscalibration():
 # FIGURE 5 — Capstone summary heatmap
 # -------------------------------------------------------------
 
-def plot_summary_heatmap():
+def plot_summary_heatmap(coverage_df=None, conv_df=None, ttest_df=None):
     """
     One synthesis figure summarizing failures across distributions.
 
+    Takes the coverage grid, convergence table and t-test grid;
+    any that are not given are computed through the cache.
+
     Saves: outputs/summary_heatmap.png
     """
+    import pandas as pd
+
+    plt = _pyplot()
+
+    if coverage_df is None:
+        coverage_df = coverage_grid()
+    if conv_df is None:
+        conv_df = convergence_table()
+    if ttest_df is None:
+        ttest_df = ttest_grid()
 
-    coverage = run_coverage_experiment().groupby("distribution")["coverage"].mean()
-    conv = run_convergence_experiment().groupby("distribution")["absolute_error"].mean()
-    ttest = run_testing_experiment().groupby("distribution")["type_i_error"].mean()
+    coverage = coverage_df.groupby("distribution")["coverage"].mean()
+    conv = conv_df.groupby("distribution")["absolute_error"].mean()
+    ttest = ttest_df.groupby("distribution")["type_i_error"].mean()
 
     summary = pd.DataFrame({
         "CI coverage": coverage,
@@ -242,30 +341,103 @@ def plot_summary_heatmap():
     plt.close()
 
 
+# -------------------------------------------------------------
+# DEPENDENCY GRAPH — each experiment is computed once per run
+# -------------------------------------------------------------
+
+DATA_NODES = {
+    "distribution_panels": (distribution_panel_data, []),
+    "coverage_grid": (coverage_grid, []),
+    "convergence_table": (convergence_table, []),
+    "ttest_grid": (ttest_grid, []),
+}
+
+# (plot function, data nodes it takes, output file)
+FIGURES = [
+    (plot_distribution_panels, ["distribution_panels"],
+     "outputs/distribution_panels.png"),
+    (plot_ci_coverage_with_width, ["coverage_grid"],
+     "outputs/ci_coverage_research.png"),
+    (plot_absolute_error_convergence, ["convergence_table"],
+     "outputs/mean_error_convergence.png"),
+    (plot_ttest_miscalibration, ["ttest_grid"],
+     "outputs/ttest_miscalibration.png"),
+    (plot_summary_heatmap,
+     ["coverage_grid", "convergence_table", "ttest_grid"],
+     "outputs/summary_heatmap.png"),
+]
+
+
 # -------------------------------------------------------------
 # MASTER RUNNER
 # -------------------------------------------------------------
 
-def main():
+def figure_digest(plot_fn, data):
+    """
+    Hash of everything a figure is drawn from: the plotting code,
+    PLOT_STYLE and its input data. Figures that compute their own
+    data (no data nodes) hash the package code version instead.
+    """
+    inputs = data if data else (code_version(),)
+    return input_hash(plot_fn, PLOT_STYLE, *inputs)
+
+
+def main(workers=None, render_workers=None, force=False):
+    """
+    Compute every data node of the figures once (independent nodes
+    in parallel when workers > 1), then draw each figure from them
+    (in a process pool when render_workers > 1).
+
+    A figure whose recorded input hash matches is not redrawn
+    unless force=True.
+    """
     print("Generating research-grade visuals...")
 
-    plot_distribution_panels()
-    print("Saved: outputs/distribution_panels.png")
+    data = run_graph(DATA_NODES, workers=workers)
+
+    jobs, rendered = [], []
+
+    for plot_fn, deps, path in FIGURES:
+        args = tuple(data[dep] for dep in deps)
+        digest = figure_digest(plot_fn, args)
 
-    plot_ci_coverage_with_width()
-    print("Saved: outputs/ci_coverage_research.png")
+        if not force and figure_is_current(path, digest):
+            print(f"Up to date: {path}")
+            continue
 
-    plot_absolute_error_convergence()
-    print("Saved: outputs/mean_error_convergence.png")
+        jobs.append((plot_fn, *args))
+        rendered.append((path, digest))
 
-    plot_ttest_miscalibration()
-    print("Saved: outputs/ttest_miscalibration.png")
+    render_figures(jobs, render_workers)
 
-    plot_summary_heatmap()
-    print("Saved: outputs/summary_heatmap.png")
+    for path, digest in rendered:
+        record_figure(path, digest)
+        print(f"Saved: {path}")
 
     print("All high-grade visuals generated.")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(
+        description="Build the research figures in outputs/."
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="redraw every figure even if its inputs are unchanged",
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--render-workers", type=int, default=None)
+    parser.add_argument("--trace", metavar="PATH",
+                        help="save per-stage timings as a Chrome trace")
+    args = parser.parse_args()
+
+    if args.trace:
+        profiling.enable()
+
+    main(workers=args.workers, render_workers=args.render_workers,
+         force=args.force)
+
+    if args.trace:
+        profiling.print_summary()
+        profiling.write_trace(args.trace)
+        print(f"Saved: {args.trace}")
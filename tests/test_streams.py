@@ -0,0 +1,40 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from confidence_intervals import coverage_tasks  # noqa: E402
+from distributions import make_distribution  # noqa: E402
+from streams import generator_name  # noqa: E402
+
+
+def first_chunk(name, **params):
+    _, gen, true_mean = make_distribution(name, **params)
+    _, _, _, reps, seed = coverage_tasks(gen, true_mean, 50, reps=10)[0]
+    block, _, _ = gen(50, seed=seed, reps=reps)
+    return seed, block
+
+
+def test_default_generator_names_are_unchanged():
+    _, gen, _ = make_distribution("lognormal")
+    assert generator_name(gen) == "generate_lognormal"
+
+
+def test_parameter_sets_get_different_streams():
+    for name, params in [("lognormal", {"sigma": 0.5}),
+                         ("student_t", {"df": 3})]:
+        seed_default, block_default = first_chunk(name)
+        seed_param, block_param = first_chunk(name, **params)
+
+        assert seed_default.spawn_key != seed_param.spawn_key
+        corr = np.corrcoef(np.log(np.abs(block_default)).ravel(),
+                           np.log(np.abs(block_param)).ravel())[0, 1]
+        assert abs(corr) < 0.2
+
+
+if __name__ == "__main__":
+    test_default_generator_names_are_unchanged()
+    test_parameter_sets_get_different_streams()
+    print("ok")